@@ -0,0 +1,18 @@
+// Subscribe an admin report to updates that the server pushes as groups finish.
+// onUpdate receives {round_number, stats, series}, where series contains
+// only the values that were added since the last update.
+function subscribeToAdminReport(socketUrl, onUpdate) {
+    let socket = makeReconnectingWebSocket(socketUrl);
+    socket.onmessage = function (e) {
+        let data = JSON.parse(e.data);
+        if (data.reload) {
+            location.reload();
+        } else {
+            onUpdate(data);
+        }
+    };
+}
+
+function setText(id, value) {
+    document.getElementById(id).innerText = value;
+}
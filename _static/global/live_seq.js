@@ -0,0 +1,17 @@
+// For live pages whose live_method has @drop_duplicates (see live_methods.py).
+// Give each message that must only be processed once a seq from newSeq(),
+// and send it again with the same seq if needed; the server ignores repeats.
+let liveSeq = 0;
+
+function newSeq() {
+    liveSeq += 1;
+    return liveSeq;
+}
+
+// Call at the start of liveRecv.
+// After a page reload, this continues the numbering from the server's last_seq.
+function updateSeq(data) {
+    if (data.last_seq > liveSeq) {
+        liveSeq = data.last_seq;
+    }
+}
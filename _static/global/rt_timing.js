@@ -0,0 +1,55 @@
+// Timing for the reaction time tasks (stroop, go_no_go); see rt_timing.py.
+// All timestamps are from the performance.now() clock, in fractional ms.
+
+let rtDisplayed = {displayed_timestamp: null, frame_ms: null};
+let rtClockOffset = null;
+let rtLastSentAt = null;
+
+// Shows the stimulus in the next frame.
+// It's only on screen from the frame after the one it was added in,
+// so that frame's start is the display time, and onShown is called then
+// (responses before it can't be to this stimulus).
+function showStimulus(element, onShown) {
+    requestAnimationFrame(function (frameStart) {
+        element.style.display = 'block';
+        rtDisplayed = {displayed_timestamp: null, frame_ms: null};
+        requestAnimationFrame(function (nextFrameStart) {
+            rtDisplayed.displayed_timestamp = nextFrameStart;
+            // if this frame was long, the stimulus was painted late
+            rtDisplayed.frame_ms = nextFrameStart - frameStart;
+            onShown(nextFrameStart);
+        });
+    });
+}
+
+// The timing fields to send with a response to the stimulus on screen.
+// event is the keypress, or null if the participant didn't respond.
+function responseTiming(event) {
+    let timing = {
+        displayed_timestamp: rtDisplayed.displayed_timestamp,
+        frame_ms: rtDisplayed.frame_ms,
+        clock_offset_ms: rtClockOffset,
+    };
+    if (event) {
+        // when the key was pressed, rather than when this code got to run
+        timing.answered_timestamp = event.timeStamp;
+        timing.input_lag_ms = performance.now() - event.timeStamp;
+    }
+    return timing;
+}
+
+// Use instead of liveSend, so that the round trip can be timed.
+function timedLiveSend(data) {
+    rtLastSentAt = performance.now();
+    liveSend(data);
+}
+
+// Call at the start of liveRecv.
+// Estimates the server clock minus the browser clock,
+// assuming the server handled the message halfway through the round trip.
+function updateClockOffset(data) {
+    if (rtLastSentAt === null || data.server_ms === undefined) return;
+    let midpoint = performance.timeOrigin + (rtLastSentAt + performance.now()) / 2;
+    rtClockOffset = data.server_ms - midpoint;
+    rtLastSentAt = null;
+}
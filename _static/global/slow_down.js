@@ -0,0 +1,24 @@
+// For live pages whose live_method has @rate_limit (see live_methods.py).
+// Call at the start of liveRecv, and return if it returns true:
+// the message was only a signal that the participant is sending too fast.
+// Their last message is processed a moment later, so nothing needs to be resent.
+let slowDownTimeout = null;
+
+function handleSlowDown(data) {
+    if (!data || !data.slow_down) return false;
+    let notice = document.getElementById('slow-down');
+    if (!notice) {
+        notice = document.createElement('div');
+        notice.id = 'slow-down';
+        notice.className = 'alert alert-warning';
+        notice.innerText = 'You are sending too fast. Your last action will go through in a moment.';
+        let content = document.querySelector('._otree-content') || document.body;
+        content.prepend(notice);
+    }
+    notice.style.display = 'block';
+    clearTimeout(slowDownTimeout);
+    slowDownTimeout = setTimeout(function () {
+        notice.style.display = 'none';
+    }, data.retry_ms + 1000);
+    return true;
+}
@@ -0,0 +1,29 @@
+// Loads the stimulus images of a task page into container.
+// Returns a promise that resolves once every image is decoded,
+// so that showing a stimulus doesn't include download or decoding time
+// in the measured reaction time.
+// If the container has a data-bundle attribute, the images are fetched in
+// 1 request from the bundle made by bundle_stimuli.py, keeping the first
+// data-num-images of them; otherwise the container already has 1 <img> per stimulus.
+function loadStimuli(container, className) {
+    let loaded = Promise.resolve();
+    if (container.dataset.bundle) {
+        loaded = fetch(container.dataset.bundle)
+            .then(response => response.json())
+            .then(function (bundle) {
+                let numImages = parseInt(container.dataset.numImages);
+                for (let src of bundle.images.slice(0, numImages)) {
+                    let img = document.createElement('img');
+                    img.className = className;
+                    img.style.display = 'none';
+                    img.src = src;
+                    container.appendChild(img);
+                }
+            });
+    }
+    return loaded.then(function () {
+        let images = Array.from(container.getElementsByTagName('img'));
+        // a broken image shouldn't stop the task from starting
+        return Promise.all(images.map(img => img.decode().catch(() => null)));
+    });
+}
@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 This bargaining game involves 2 players. Each demands for a portion of some
@@ -35,6 +36,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     players = group.get_players()
     group.total_requests = sum([p.request for p in players])
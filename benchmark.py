@@ -0,0 +1,386 @@
+"""
+Micro-benchmarks of the code that runs once per group when a round ends
+(set_payoffs), and on every admin report refresh (vars_for_admin_report),
+on synthetic sessions of 10, 100 and 1,000 groups, to see how they scale.
+
+    python benchmark.py                     # compare with benchmark_baseline.json
+    python benchmark.py public_goods cournot --sizes 10 100
+    python benchmark.py --save              # record a new baseline
+
+Each session is created with the app's session config,
+then every player is given a random decision (and, for the reaction time tasks
+and the double auction, a full set of trials or transactions).
+Apps without groups (stroop, go_no_go) get 1 player per "group".
+The database is in memory, so db.sqlite3 is not changed.
+
+Each benchmark is run a few times, and the fastest run is reported (like timeit),
+since the slower runs are mostly noise from other processes.
+Like in a real request, each run starts with an empty identity map,
+so data is loaded from the database.
+
+set_payoffs is timed for all groups of round 1, each group in its own
+"request" (as each group's wait page is), with the admin report open,
+so that it includes updating the report's aggregates.
+The admin reports are timed both without their aggregates (the first time the
+report is opened, or after a server restart) and with them (every later refresh).
+
+Timings are only comparable on the same machine, so the baseline isn't
+committed: the first run on a machine records it (so run it before making
+changes), and later runs compare with it. A result more than REGRESSION_RATIO
+times the baseline is reported, and the exit status is 1.
+A baseline recorded on another host is only shown for reference.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+
+BASELINE_PATH = Path('benchmark_baseline.json')
+SIZES = [10, 100, 1000]
+REPEAT = 5
+# timings vary from run to run, so small differences are ignored.
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.001
+
+SET_PAYOFFS_APPS = [
+    'public_goods',
+    'cournot',
+    'bertrand',
+    'guess_two_thirds',
+    'volunteer_dilemma',
+]
+
+
+def fill_public_goods(app, subsession, rng):
+    for p in subsession.get_players():
+        p.contribution = rng.randint(0, subsession.session.config['endowment'])
+
+
+def fill_cournot(app, subsession, rng):
+    for p in subsession.get_players():
+        p.units = rng.randint(0, app.Constants.max_units_per_player)
+
+
+def fill_bertrand(app, subsession, rng):
+    for p in subsession.get_players():
+        p.price = rng.randint(0, int(app.Constants.maximum_price))
+
+
+def fill_guess_two_thirds(app, subsession, rng):
+    for p in subsession.get_players():
+        p.guess = rng.randint(0, app.Constants.guess_max)
+
+
+def fill_volunteer_dilemma(app, subsession, rng):
+    for p in subsession.get_players():
+        p.volunteer = rng.random() < 0.5
+
+
+def fill_prisoner(app, subsession, rng):
+    for p in subsession.get_players():
+        p.cooperated = rng.random() < 0.5
+
+
+def fill_stroop(app, subsession, rng):
+    for p in subsession.get_players():
+        for stimulus in app.STIMULI:
+            app.Trial.create(
+                player=p,
+                is_correct=rng.random() < 0.9,
+                reaction_ms=rng.gauss(650, 150),
+                is_janky=False,
+                **stimulus,
+            )
+        p.num_completed = len(app.STIMULI)
+
+
+def fill_go_no_go(app, subsession, rng):
+    for p in subsession.get_players():
+        for image_id in range(app.Constants.num_images):
+            is_red = image_id in app.Constants.red_images
+            pressed = rng.random() < 0.7
+            app.Trial.create(
+                player=p,
+                image_id=image_id,
+                is_red=is_red,
+                pressed=pressed,
+                is_error=is_red == pressed,
+                reaction_ms=rng.gauss(450, 100) if pressed else None,
+                is_janky=False,
+            )
+        p.num_completed = app.Constants.num_images
+
+
+def fill_double_auction(app, subsession, rng):
+    for group in subsession.get_groups():
+        buyers = [p for p in group.get_players() if p.is_buyer]
+        sellers = [p for p in group.get_players() if not p.is_buyer]
+        for seconds in range(0, 60, 10):
+            buyer = rng.choice(buyers)
+            seller = rng.choice(sellers)
+            price = rng.randint(seller.break_even_point, app.Constants.valuation_max)
+            app.Transaction.create(
+                group=group, buyer=buyer, seller=seller, price=price, seconds=seconds
+            )
+            for p in [buyer, seller]:
+                p.participant.transaction_history.append(
+                    [seconds, int(p.break_even_point)]
+                )
+
+
+# gives each player of the subsession a decision
+FILL_FUNCTIONS = dict(
+    public_goods=fill_public_goods,
+    cournot=fill_cournot,
+    bertrand=fill_bertrand,
+    guess_two_thirds=fill_guess_two_thirds,
+    volunteer_dilemma=fill_volunteer_dilemma,
+    prisoner=fill_prisoner,
+    stroop=fill_stroop,
+    go_no_go=fill_go_no_go,
+    double_auction=fill_double_auction,
+)
+
+
+def get_app_names():
+    from otree.common import get_models_module
+
+    return [
+        app_name
+        for app_name in FILL_FUNCTIONS
+        if app_name in SET_PAYOFFS_APPS
+        or hasattr(get_models_module(app_name), 'vars_for_admin_report')
+    ]
+
+
+def get_config_name(app_name):
+    from otree.session import SESSION_CONFIGS_DICT
+
+    for name, config in SESSION_CONFIGS_DICT.items():
+        if config['app_sequence'] == [app_name]:
+            return name
+    raise Exception(f'No session config has app_sequence {[app_name]}')
+
+
+def create_session(app, app_name, num_groups):
+    from otree.session import create_session, SESSION_CONFIGS_DICT
+    from otree.database import db
+
+    config_name = get_config_name(app_name)
+    config = SESSION_CONFIGS_DICT[config_name]
+    players_per_group = (
+        config.get('players_per_group') or app.Constants.players_per_group or 1
+    )
+    session = create_session(
+        config_name, num_participants=num_groups * players_per_group
+    )
+    # same data on every run
+    rng = random.Random(num_groups)
+    for subsession in session.get_subsessions():
+        FILL_FUNCTIONS[app_name](app, subsession, rng)
+    db.commit()
+    return session
+
+
+def best_time(setup, run, repeat):
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def new_request():
+    """Like oTree does for each request, start with an empty identity map."""
+    from otree.database import db
+
+    db.close()
+    db.new_session()
+
+
+def finish_groups(app, group_ids):
+    from otree.database import db
+
+    for group_id in group_ids:
+        # each group's wait page is a separate request
+        new_request()
+        app.set_payoffs(app.Group.objects_get(id=group_id))
+        db.commit()
+
+
+def reset_groups(app, subsession_id):
+    """Clears the fields that set_payoffs sets on the groups, so they can finish again"""
+    from otree.database import db, OTreeColumn
+
+    initial_values = {
+        column.name: column.default.arg if column.default else None
+        for column in app.Group.__table__.columns
+        if isinstance(column, OTreeColumn)
+    }
+    if initial_values:
+        db.query(app.Group).filter_by(subsession_id=subsession_id).update(
+            initial_values
+        )
+    db.commit()
+
+
+def benchmark_app(app_name, sizes, repeat):
+    """Returns {benchmark name: {size: seconds}}"""
+    from otree.common import get_models_module
+    import report_aggregates
+
+    app = get_models_module(app_name)
+    admin_report = getattr(app, 'vars_for_admin_report', None)
+    results = {}
+
+    for num_groups in sizes:
+        session = create_session(app, app_name, num_groups)
+        subsession_ids = [ss.id for ss in session.get_subsessions()]
+        group_ids = {
+            ss.id: [group.id for group in ss.get_groups()]
+            for ss in session.get_subsessions()
+        }
+
+        if app_name in SET_PAYOFFS_APPS:
+            first_round_id = subsession_ids[0]
+
+            def open_report():
+                reset_groups(app, first_round_id)
+                new_request()
+                report_aggregates.REPORT_AGGREGATES.clear()
+                if admin_report:
+                    admin_report(app.Subsession.objects_get(id=first_round_id))
+
+            results.setdefault(f'{app_name}.set_payoffs', {})[num_groups] = best_time(
+                open_report,
+                lambda: finish_groups(app, group_ids[first_round_id]),
+                repeat,
+            )
+
+        if admin_report:
+            # the admin reports only show groups that are finished
+            if hasattr(app, 'set_payoffs'):
+                for subsession_id in subsession_ids:
+                    finish_groups(app, group_ids[subsession_id])
+
+            def restart_server():
+                new_request()
+                report_aggregates.REPORT_AGGREGATES.clear()
+
+            def refresh_report():
+                # the last round's report shows the most history
+                admin_report(app.Subsession.objects_get(id=subsession_ids[-1]))
+
+            for label, setup in [('', restart_server), (' (cached)', new_request)]:
+                name = f'{app_name}.vars_for_admin_report{label}'
+                results.setdefault(name, {})[num_groups] = best_time(
+                    setup, refresh_report, repeat
+                )
+        report_aggregates.REPORT_AGGREGATES.clear()
+        new_request()
+    return results
+
+
+def format_ms(seconds):
+    if seconds is None:
+        return '-'
+    return f'{seconds * 1000:.2f}'
+
+
+def report(results, baseline, sizes):
+    regressions = []
+    print(f'{"ms (fastest of runs)":<45}' + ''.join(f'{n:>10}' for n in sizes))
+    for name, by_size in results.items():
+        cells = []
+        for num_groups in sizes:
+            seconds = by_size.get(num_groups)
+            cell = format_ms(seconds)
+            old_seconds = baseline.get(name, {}).get(str(num_groups))
+            if (
+                seconds is not None
+                and old_seconds is not None
+                and seconds > old_seconds * REGRESSION_RATIO
+                and seconds - old_seconds > REGRESSION_MIN_SECONDS
+            ):
+                cell += '!'
+                regressions.append(
+                    f'{name} ({num_groups} groups): '
+                    f'{format_ms(old_seconds)} ms -> {format_ms(seconds)} ms'
+                )
+            cells.append(f'{cell:>10}')
+        print(f'{name:<45}' + ''.join(cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('apps', nargs='*', help='default: all apps')
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument(
+        '--save', action='store_true', help=f'write the results to {BASELINE_PATH}'
+    )
+    args = parser.parse_args()
+
+    # before oTree is imported
+    os.environ['OTREE_IN_MEMORY'] = '1'
+    from otree.main import setup
+
+    setup()
+
+    results = {}
+    for app_name in args.apps or get_app_names():
+        results.update(benchmark_app(app_name, args.sizes, args.repeat))
+
+    baseline = {}
+    same_host = True
+    if BASELINE_PATH.exists():
+        saved = json.loads(BASELINE_PATH.read_text())
+        baseline = saved['results']
+        same_host = saved.get('host') == platform.node()
+    regressions = report(results, baseline, args.sizes)
+
+    if args.save or not BASELINE_PATH.exists():
+        import otree
+
+        # a partial run only replaces its own results
+        for name, by_size in results.items():
+            baseline.setdefault(name, {}).update(
+                {str(n): seconds for n, seconds in by_size.items()}
+            )
+        BASELINE_PATH.write_text(
+            json.dumps(
+                dict(
+                    python=platform.python_version(),
+                    otree=otree.__version__,
+                    machine=platform.machine(),
+                    host=platform.node(),
+                    repeat=args.repeat,
+                    # seconds, keyed by number of groups
+                    results=baseline,
+                ),
+                indent=2,
+            )
+        )
+        print(f'Saved to {BASELINE_PATH}')
+    elif regressions:
+        print(f'\nSlower than {BASELINE_PATH}:')
+        for line in regressions:
+            print('  ' + line)
+        if same_host:
+            sys.exit(1)
+        print(
+            'The baseline was recorded on another host, so this is only for reference.'
+            ' Run with --save to replace it.'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 2 firms complete in a market by setting prices for homogenous goods.
@@ -35,6 +36,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     import random
 
@@ -0,0 +1,74 @@
+"""
+Packs the stimulus images of a task (_static/stroop/0.png, 1.png, ...)
+into 1 file of data URIs, so each participant's Task page loads all its
+images in 1 request instead of 1 request per image.
+When a whole class starts the task at the same moment, that's the difference
+between a few hundred requests to the static server and several thousand.
+
+    python bundle_stimuli.py stroop go_no_go:10
+
+APP:N bundles only the first N images, for a task that shows fewer images
+than it has (go_no_go has 20 but Constants.num_images is 10).
+The Task page uses a bundle if it has at least as many images as the task
+shows, and ignores the rest.
+
+For each app, this writes _static/<app>/stimuli.<hash>.json,
+and a manifest (_static/<app>/stimuli_manifest.json) that tells the Task page
+where the bundle is. Re-run it whenever the images change, then restart the server,
+since the manifest is read once per process.
+If there is no manifest, the Task page loads the images 1 by 1.
+"""
+
+import base64
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+STATIC_DIR = Path('_static')
+MANIFEST_NAME = 'stimuli_manifest.json'
+
+
+def get_image_paths(app_dir: Path, num_images=None):
+    """The images are named by image ID, starting from 0."""
+    paths = []
+    while (app_dir / '{}.png'.format(len(paths))).exists():
+        if len(paths) == num_images:
+            break
+        paths.append(app_dir / '{}.png'.format(len(paths)))
+    return paths
+
+
+def bundle_app(app_name, num_images=None):
+    app_dir = STATIC_DIR / app_name
+    paths = get_image_paths(app_dir, num_images)
+    if not paths:
+        sys.exit(f'No images found in {app_dir} (expected 0.png, 1.png, ...)')
+    if num_images and len(paths) < num_images:
+        sys.exit(f'{app_dir} has only {len(paths)} images, not {num_images}')
+    images = [
+        'data:image/png;base64,' + base64.b64encode(path.read_bytes()).decode('ascii')
+        for path in paths
+    ]
+    content = json.dumps(dict(images=images)).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    file_name = f'stimuli.{digest}.json'
+
+    for old_bundle in app_dir.glob('stimuli.*.json'):
+        old_bundle.unlink()
+    (app_dir / file_name).write_bytes(content)
+    manifest = dict(bundle=f'{app_name}/{file_name}', num_images=len(images))
+    (app_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    print(f'{app_name}: bundled {len(images)} images ({len(content) // 1024} KB)')
+
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit('Usage: python bundle_stimuli.py APP_NAME[:NUM_IMAGES] ...')
+    for arg in sys.argv[1:]:
+        app_name, _, num_images = arg.partition(':')
+        bundle_app(app_name, int(num_images) if num_images else None)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from otree.api import *
 from shared_out import set_players_per_group
+from instrumentation import instrument
 
 
 
@@ -54,6 +55,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def creating_session(subsession: Subsession):
     for g in subsession.get_groups():
         import random
@@ -64,6 +66,7 @@ def creating_session(subsession: Subsession):
         g.item_value = round(item_value, 1)
 
 
+@instrument
 def set_winner(group: Group):
     import random
 
@@ -1,6 +1,12 @@
 from otree.api import *
 
 from shared_out import get_or_none
+from report_aggregates import (
+    get_report_aggregates,
+    update_report_aggregates,
+    admin_report_socket_url,
+)
+from instrumentation import instrument
 
 doc = """
 In Cournot competition, firms simultaneously decide the units of products to
@@ -23,76 +29,59 @@ class Subsession(BaseSubsession):
     pass
 
 
+def record_units(aggregates, group):
+    if get_or_none(group, 'total_units') == None:
+        return False
+    aggregates.series['group_names'].append("Group " + str(group.id_in_subsession))
+    for p in group.get_players():
+        aggregates.series["Player " + str(p.id_in_group)].append(p.units)
+        aggregates.stats['units'].add(p.units)
+    aggregates.series['lowest_payoff_best_response_function'].append(
+        group.lowest_payoff_best_response_function
+    )
+    return True
+
+
 def vars_for_admin_report(subsession: Subsession):
-    group_names = ["Group " + str(g.id_in_subsession) for g in subsession.get_groups()]
-
-    # create player data list
-    player_data = []
-    for g in subsession.get_groups():
-        i = 0
-        for p in g.get_players():
-            i = i + 1
-            units = 0
-            if get_or_none(p, 'units') == None:
-                units = 0
-            else:
-                units = p.units
-            player_data.append(
-                dict(
-                    # player_position="Player "+ str(i), # this is only needed if the players
-                    # dont have similar ids in the different groups
-                    name="Player " + str(p.id_in_group),
-                    data=[units]
-                )
-            )
+    aggregates = get_report_aggregates(subsession, record_units)
+    group_names = aggregates.series['group_names']
+
+    # each highcharts series is the "first" (or second, etc) player in every group,
+    # with 1 data point per group - design limitation by highcharts
+    player_data_matched = []
+    for id_in_group in range(1, Constants.players_per_group + 1):
+        name = "Player " + str(id_in_group)
+        player_data_matched.append(
+            dict(name=name, id=name, data=aggregates.series[name])
+        )
 
     # todo
     # sort from least total units per group to highest on graph - this not possible/complicated with highcharts
     # use table to show optimal outcome (put table on top) - try "color by value in excel "
 
-    # match players in player data by index so that; the "first" player in each group
-    # has units assigned for each highcharts series - design limitation by highcharts
-    player_data_matched = {}
-    for player in player_data:
-        name = player['name']
-        if name in player_data_matched.keys():
-            player_data_matched[name]['data'].append(player['data'][0])
-        else:
-            player_data_matched[name] = player
-
-    # convert the values to a list
-    player_data_matched = list(player_data_matched.values())
-
-    lowest_payoff_best_response_function = [
-        g.lowest_payoff_best_response_function
-        for g in subsession.get_groups()
-        if get_or_none(g, 'lowest_payoff_best_response_function') != None
-    ]
-
     # add brf units to player_data_matched list
     player_data_matched.append(dict(
         name='Best response function units for player with least payoff',
+        id='lowest_payoff_best_response_function',
         color='#00FF00',
-        data=lowest_payoff_best_response_function
+        data=aggregates.series['lowest_payoff_best_response_function']
     ))
 
-    units_all_players = [
-        p.units for p in subsession.get_players()
-        if get_or_none(p, 'units') != None
-    ]
+    units_stats = aggregates.stats['units']
 
     nash_equilibrium=(Constants.total_capacity/3) * Constants.players_per_group
 
     context = dict(
+        live_report_url=admin_report_socket_url(subsession),
         group_names=group_names,
         player_data_matched=player_data_matched,
         nash_equilibrium=nash_equilibrium
     )
-    if units_all_players:
+    if units_stats.count:
         context.update(
-            avg_units=sum(units_all_players) / len(units_all_players),
-            min_units=min(units_all_players),
-            max_units=max(units_all_players)
+            avg_units=units_stats.mean,
+            min_units=units_stats.min,
+            max_units=units_stats.max
         )
         return context
     else:
@@ -124,6 +113,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     players = group.get_players()
     group.total_units = sum([p.units for p in players])
@@ -136,6 +126,7 @@ def set_payoffs(group: Group):
     group.lowest_payoff_best_response_function = (Constants.total_capacity - lower_payoff)/2
     for p in players:
         p.payoff = group.unit_price * p.units
+    update_report_aggregates(group, record_units)
 
 
 def other_player(player: Player):
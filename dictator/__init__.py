@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 One player decides how to divide a certain amount between himself and the other
@@ -36,6 +37,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     p1 = group.get_player_by_id(1)
     p2 = group.get_player_by_id(2)
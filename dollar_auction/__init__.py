@@ -1,5 +1,8 @@
 from otree.api import *
 from shared_out import set_players_per_group
+from live_methods import live_tick, rate_limit
+from group_actor import GroupActor
+from instrumentation import instrument
 
 
 doc = """
@@ -19,6 +22,7 @@ class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     set_players_per_group(subsession)
 
@@ -33,13 +37,22 @@ class Group(BaseGroup):
     auction_timeout = models.FloatField()
 
 
-def get_state(group: Group):
-    return dict(
-        top_bid=group.top_bid,
-        top_bidder=group.top_bidder,
-        second_bid=group.second_bid,
-        second_bidder=group.second_bidder,
-    )
+AUCTION_FIELDS = ['top_bid', 'top_bidder', 'second_bid', 'second_bidder']
+
+
+class Auction(GroupActor):
+    """The group's top and second bids, kept in memory (see group_actor.py)"""
+
+    def load(self, group: Group):
+        for field in AUCTION_FIELDS:
+            setattr(self, field, getattr(group, field))
+
+    def save(self, group: Group):
+        for field in AUCTION_FIELDS:
+            setattr(group, field, getattr(self, field))
+
+    def get_state(self):
+        return {field: getattr(self, field) for field in AUCTION_FIELDS}
 
 
 class Player(BasePlayer):
@@ -53,6 +66,7 @@ class Intro(Page):
 
 class WaitToStart(WaitPage):
     @staticmethod
+    @instrument
     def after_all_players_arrive(group: Group):
         import time
 
@@ -73,23 +87,30 @@ class Bid(Page):
         return dict(my_id=player.id_in_group)
 
     @staticmethod
+    @instrument
+    @rate_limit()
+    @live_tick()
     def live_method(player: Player, bid):
         group = player.group
+        auction = Auction.for_group(group)
         my_id = player.id_in_group
         if bid:
-            if bid > group.top_bid:
-                group.second_bid = group.top_bid
-                group.second_bidder = group.top_bidder
-                group.top_bid = bid
-                group.top_bidder = my_id
-                return {0: dict(get_state(group), new_top_bid=True)}
+            if bid > auction.top_bid:
+                auction.second_bid = auction.top_bid
+                auction.second_bidder = auction.top_bidder
+                auction.top_bid = bid
+                auction.top_bidder = my_id
+                auction.changed(group)
+                return {0: dict(auction.get_state(), new_top_bid=True)}
         else:
-            return {my_id: get_state(group)}
+            return {my_id: auction.get_state()}
 
 
 class ResultsWaitPage(WaitPage):
     @staticmethod
+    @instrument
     def after_all_players_arrive(group: Group):
+        Auction.close(group)
         if group.top_bidder > 0:
             top_bidder = group.get_player_by_id(group.top_bidder)
             top_bidder.payoff = Constants.jackpot - group.top_bid
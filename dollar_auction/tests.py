@@ -0,0 +1,64 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+import random
+from live_methods import replay_live_messages
+from . import *
+
+NUM_RANDOM_MESSAGES = 300
+
+
+def scripted_messages(group: Group):
+    # on page load
+    for p in group.get_players():
+        yield p.id_in_group, 0
+    yield 1, 10
+    yield 2, 20
+    # not higher than the top bid, so it's ignored
+    retval = yield 1, 15
+    expect(retval, None)
+    retval = yield 3, 30
+    expect(retval[0]['top_bidder'], 3)
+
+
+def random_messages(group: Group):
+    # seeded, so that each run sends the same messages
+    rng = random.Random(group.id_in_subsession)
+    players = group.get_players()
+    auction = Auction.for_group(group)
+    for i in range(NUM_RANDOM_MESSAGES):
+        p = rng.choice(players)
+        if rng.random() < 0.1:
+            yield p.id_in_group, 0
+        else:
+            # sometimes too low, when another player got there first
+            yield p.id_in_group, int(auction.top_bid) + rng.randint(-2, 10)
+
+
+def is_scripted(case, group: Group):
+    # the script is for 3 players. with a different number of participants,
+    # the last group can be smaller.
+    return case == 'scripted' and len(group.get_players()) == 3
+
+
+def call_live_method(method, group: Group, case, **kwargs):
+    if is_scripted(case, group):
+        script = scripted_messages(group)
+    else:
+        script = random_messages(group)
+    replay_live_messages(method, group, script)
+
+    # the bids are saved in the background
+    Auction.for_group(group).flush(group)
+    expect(group.top_bid, '>', group.second_bid)
+
+
+class PlayerBot(Bot):
+
+    cases = ['scripted', 'random']
+
+    def play_round(self):
+        yield Intro
+        yield Submission(Bid, timeout_happened=True, check_html=False)
+        if is_scripted(self.case, self.group):
+            expected_payoff = {1: 0, 2: -20, 3: Constants.jackpot - 30}
+            expect(self.player.payoff, expected_payoff[self.player.id_in_group])
+        yield Submission(Results, check_html=False)
@@ -1,7 +1,14 @@
 from otree.api import *
 from shared_out import set_players_per_group
+from live_methods import live_tick, rate_limit
+from report_aggregates import admin_report_socket_url, push_admin_report_update
+from group_actor import GroupActor
+from .order_book import OrderBook
+from .trade_tape import TradeTape
+import table_export
 import time
 import random
+from instrumentation import instrument
 
 
 class Constants(BaseConstants):
@@ -19,6 +26,7 @@ class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     set_players_per_group(subsession)
     players = subsession.get_players()
@@ -42,33 +50,52 @@ def creating_session(subsession: Subsession):
         participant.transaction_history.append([0, int(p.break_even_point)])
 
 
-def vars_for_admin_report(subsession: Subsession):
-    players = subsession.get_players()
-    group = players[0].group
-
-    break_evens = {
-        player.id_in_group: player.participant.transaction_history for player in players
-    }
+def get_report_series(group):
+    # the market is only open during trading. after that, everything is saved.
+    market = Market.get_open(group)
+    if market:
+        # so that the transaction history includes trades that aren't saved yet
+        market.flush(group)
     highcharts_series = []
-
-    for key in break_evens.keys():
+    for player in group.get_players():
+        key = player.id_in_group
         highcharts_series.append(
-            {'name': 'Player {}'.format(key), 'data': break_evens[key], 'type': 'line'}
+            {
+                'name': 'Player {}'.format(key),
+                'id': 'Player {}'.format(key),
+                'data': player.participant.transaction_history,
+                'type': 'line',
+            }
         )
 
     highcharts_series.append(
         {
             'name': 'Transactions',
-            'data': [[tx.seconds, tx.price] for tx in Transaction.filter(group=group)],
+            'id': 'Transactions',
+            'data': get_trade_tape(group).series(),
             'type': 'scatter',
         }
     )
+    return highcharts_series
+
 
-    return dict(highcharts_series=highcharts_series)
+def vars_for_admin_report(subsession: Subsession):
+    # 1 chart per group, since each group is a separate market
+    groups = [
+        dict(id_in_subsession=group.id_in_subsession, series=get_report_series(group))
+        for group in subsession.get_groups()
+    ]
+    return dict(
+        groups=groups,
+        live_report_url=admin_report_socket_url(subsession),
+    )
 
 
 class Group(BaseGroup):
     start_timestamp = models.IntegerField()
+    seq = models.IntegerField(
+        initial=0, doc="Sequence number of the last update broadcast to the group"
+    )
 
 
 class Player(BasePlayer):
@@ -86,82 +113,235 @@ class Transaction(ExtraModel):
     seconds = models.IntegerField(doc="Timestamp (seconds since beginning of trading)")
 
 
-def find_match(buyers, sellers):
-    for buyer in buyers:
-        for seller in sellers:
-            if seller.num_items > 0 and seller.current_offer <= buyer.current_offer:
-                return [buyer, seller]
-
-
-def live_method(player: Player, data):
-    group = player.group
-    players = group.get_players()
-    buyers = [p for p in players if p.is_buyer]
-    sellers = [p for p in players if not p.is_buyer]
-    news = None
-    if data:
-        try:
-            offer = int(data['offer'])
-        except Exception:
-            print('invalid message received:', data)
-            return
-        player.current_offer = offer
-        if player.is_buyer:
-            match = find_match(buyers=[player], sellers=sellers)
-        else:
-            match = find_match(buyers=buyers, sellers=[player])
-        if match:
-            [buyer, seller] = match
-            price = buyer.current_offer
-            seconds = int(time.time() - group.start_timestamp)
+class Trader:
+    """A player's state in the market"""
+
+    FIELDS = ['is_buyer', 'current_offer', 'break_even_point', 'num_items', 'payoff']
+
+    def __init__(self, player: Player):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(player, field))
+        # [seconds, break_even_point], not yet added to participant.transaction_history
+        self.new_history = []
+
+
+class Market(GroupActor):
+    """
+    The group's order book, trade tape and traders, kept in memory
+    (see group_actor.py). If the server restarts, they are rebuilt from the database.
+    """
+
+    def load(self, group: Group):
+        self.seq = group.seq
+        self.traders = {p.id_in_group: Trader(p) for p in group.get_players()}
+        self.book = OrderBook()
+        for id_in_group, trader in self.traders.items():
+            if is_in_book(trader):
+                self.book.submit(id_in_group, trader.is_buyer, int(trader.current_offer))
+        self.book.pop_changes()
+        self.tape = load_trade_tape(group)
+        # (buyer ID, seller ID, price, seconds), not yet saved
+        self.new_transactions = []
+
+    def save(self, group: Group):
+        group.seq = self.seq
+        players = {p.id_in_group: p for p in group.get_players()}
+        for id_in_group, trader in self.traders.items():
+            player = players[id_in_group]
+            for field in Trader.FIELDS:
+                value = getattr(trader, field)
+                # setting the payoff commits, so only set what changed
+                if getattr(player, field) != value:
+                    setattr(player, field, value)
+            player.participant.transaction_history.extend(trader.new_history)
+            trader.new_history = []
+        for buyer_id, seller_id, price, seconds in self.new_transactions:
             Transaction.create(
-                group=group, buyer=buyer, seller=seller, price=price, seconds=seconds,
+                group=group,
+                buyer=players[buyer_id],
+                seller=players[seller_id],
+                price=price,
+                seconds=seconds,
             )
-            buyer.num_items += 1
-            seller.num_items -= 1
-            buyer.payoff += buyer.break_even_point - price
-            seller.payoff += price - seller.break_even_point
-            buyer.current_offer = 0
-            seller.current_offer = Constants.valuation_max + 1
-            buyer.break_even_point = random.randint(
-                Constants.valuation_min, buyer.break_even_point
-            )
-            buyer.participant.transaction_history.append(
-                [seconds, int(buyer.break_even_point)]
-            )
-            seller.participant.transaction_history.append(
-                [seconds, int(seller.break_even_point)]
+        self.new_transactions = []
+
+    def find_match(self, id_in_group):
+        trader = self.traders[id_in_group]
+        if is_in_book(trader):
+            return self.book.submit(
+                id_in_group, trader.is_buyer, int(trader.current_offer)
             )
-            news = dict(buyer=buyer.id_in_group, seller=seller.id_in_group, price=price)
+        self.book.cancel(id_in_group)
+        return []
+
+    def trade(self, buyer_id, seller_id, price, seconds):
+        buyer = self.traders[buyer_id]
+        seller = self.traders[seller_id]
+        self.tape.append(seconds, price)
+        self.new_transactions.append((buyer_id, seller_id, price, seconds))
+        buyer.num_items += 1
+        seller.num_items -= 1
+        buyer.payoff += buyer.break_even_point - price
+        seller.payoff += price - seller.break_even_point
+        buyer.current_offer = 0
+        seller.current_offer = Constants.valuation_max + 1
+        buyer.break_even_point = random.randint(
+            Constants.valuation_min, buyer.break_even_point
+        )
+        for trader in [buyer, seller]:
+            trader.new_history.append([seconds, int(trader.break_even_point)])
+
+
+def is_in_book(trader: Trader):
+    if trader.is_buyer:
+        return trader.current_offer > 0
+    return trader.num_items > 0 and trader.current_offer <= Constants.valuation_max
+
+
+def load_trade_tape(group: Group) -> TradeTape:
+    tape = TradeTape()
+    for tx in Transaction.filter(group=group):
+        tape.append(tx.seconds, tx.price)
+    return tape
+
 
-    bids = sorted(
-        [p.current_offer for p in buyers if p.current_offer > 0], reverse=True
+def get_trade_tape(group: Group) -> TradeTape:
+    """Doesn't open the market, so it can be used after trading ends"""
+    market = Market.get_open(group)
+    if market:
+        return market.tape
+    return load_trade_tape(group)
+
+
+def get_player_state(trader: Trader):
+    return dict(
+        num_items=trader.num_items,
+        current_offer=trader.current_offer,
+        payoff=trader.payoff,
+        break_even=trader.break_even_point,
     )
-    asks = sorted(
-        [p.current_offer for p in sellers if p.current_offer <= Constants.valuation_max]
+
+
+def get_snapshot(market: Market, id_in_group):
+    return dict(
+        is_snapshot=True,
+        seq=market.seq,
+        bids=market.book.bids(),
+        asks=market.book.asks(),
+        highcharts_series=market.tape.series(),
+        players={id_in_group: get_player_state(market.traders[id_in_group])},
     )
-    highcharts_series = [
-        [tx.seconds, tx.price] for tx in Transaction.filter(group=group)
-    ]
 
+
+def merge_deltas(old, new):
+    """in tick mode, several deltas can be combined into 1 message"""
+    return dict(
+        new,
+        from_seq=old.get('from_seq', old['seq']),
+        book=old['book'] + new['book'],
+        trades=old['trades'] + new['trades'],
+        players={**old['players'], **new['players']},
+        news=old['news'] + new['news'],
+    )
+
+
+@instrument
+@rate_limit()
+@live_tick(merge=merge_deltas)
+def live_method(player: Player, data):
+    """
+    Clients get a full snapshot when they send {} (on page load),
+    or {'seq': ...} if they notice they missed an update.
+    After that, each offer is broadcast as a delta containing
+    only the book changes, new trades, and players whose state changed.
+    """
+    group = player.group
+    market = Market.for_group(group)
+    my_id = player.id_in_group
+    if not data or 'offer' not in data:
+        return {my_id: get_snapshot(market, my_id)}
+    try:
+        offer = int(data['offer'])
+    except Exception:
+        print('invalid message received:', data)
+        return
+    market.traders[my_id].current_offer = offer
+    changed_ids = {my_id}
+    trades = []
+    report_series = {}
+    news = []
+    for fill in market.find_match(my_id):
+        if market.traders[my_id].is_buyer:
+            buyer_id, seller_id = my_id, fill.seller_id
+        else:
+            buyer_id, seller_id = fill.buyer_id, my_id
+        price = cu(fill.price)
+        seconds = int(time.time() - group.start_timestamp)
+        market.trade(buyer_id, seller_id, price, seconds)
+        changed_ids.update([buyer_id, seller_id])
+        trades.append([seconds, price])
+        report_series.setdefault('Transactions', []).append([seconds, int(price)])
+        for id_in_group in [buyer_id, seller_id]:
+            report_series.setdefault('Player {}'.format(id_in_group), []).append(
+                [seconds, int(market.traders[id_in_group].break_even_point)]
+            )
+        news.append(dict(buyer=buyer_id, seller=seller_id, price=price))
+
+    if report_series:
+        push_admin_report_update(
+            group, dict(group=group.id_in_subsession, series=report_series)
+        )
+    market.seq += 1
+    market.changed(group)
     return {
-        p.id_in_group: dict(
-            bids=bids,
-            asks=asks,
-            highcharts_series=highcharts_series,
-            num_items=p.num_items,
-            current_offer=p.current_offer,
+        0: dict(
+            seq=market.seq,
+            book=market.book.pop_changes(),
+            trades=trades,
+            players={
+                id_in_group: get_player_state(market.traders[id_in_group])
+                for id_in_group in changed_ids
+            },
             news=news,
-            payoff=p.payoff,
-            break_even=p.break_even_point,
         )
-        for p in players
     }
 
 
+def export_query():
+    """All transactions of all sessions, for table_export"""
+    from otree.models import Session
+    from sqlalchemy.orm import aliased
+
+    Buyer = aliased(Player)
+    Seller = aliased(Player)
+    return (
+        Transaction.objects_filter()
+        .join(Group, Transaction.group_id == Group.id)
+        .join(Session, Group.session_id == Session.id)
+        .join(Buyer, Transaction.buyer_id == Buyer.id)
+        .join(Seller, Transaction.seller_id == Seller.id)
+        .order_by(Transaction.id)
+        .with_entities(
+            Session.code.label('session_code'),
+            Group.id_in_subsession.label('group'),
+            Transaction.seconds,
+            Buyer.id_in_group.label('buyer'),
+            Seller.id_in_group.label('seller'),
+            Transaction.price,
+        )
+    )
+
+
+def custom_export(players):
+    # the transactions are streamed directly from the database rather than
+    # being looked up group by group.
+    yield from table_export.iter_rows(export_query())
+
+
 # PAGES
 class WaitToStart(WaitPage):
     @staticmethod
+    @instrument
     def after_all_players_arrive(group: Group):
         group.start_timestamp = int(time.time())
 
@@ -182,7 +362,10 @@ class Trading(Page):
 
 
 class ResultsWaitPage(WaitPage):
-    pass
+    @staticmethod
+    @instrument
+    def after_all_players_arrive(group: Group):
+        Market.close(group)
 
 
 class Results(Page):
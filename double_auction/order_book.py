@@ -0,0 +1,143 @@
+import heapq
+import itertools
+
+
+class Order:
+    __slots__ = ['player_id', 'is_buy', 'price', 'quantity', 'seq']
+
+    def __init__(self, player_id, is_buy, price, quantity, seq):
+        self.player_id = player_id
+        self.is_buy = is_buy
+        self.price = price
+        self.quantity = quantity
+        self.seq = seq
+
+
+class Fill:
+    __slots__ = ['buyer_id', 'seller_id', 'price', 'quantity']
+
+    def __init__(self, buyer_id, seller_id, price, quantity):
+        self.buyer_id = buyer_id
+        self.seller_id = seller_id
+        self.price = price
+        self.quantity = quantity
+
+
+class OrderBook:
+    """
+    Limit order book with price-time priority.
+    Each player has at most 1 resting order; submitting a new one replaces it.
+    Bids and asks are kept in heaps. Cancelled orders are left in the heap
+    and skipped when they reach the top, so submitting, cancelling and matching
+    are all O(log n).
+    Trades execute at the bid price, which is how the game has always worked.
+
+    Every order that enters or leaves the book is recorded in a journal,
+    so that callers can send clients just the changes (see pop_changes).
+    """
+
+    def __init__(self):
+        # heap entries are (key, seq, order). key is -price for bids
+        # so that the best bid is at the top of a min-heap.
+        self._bids = []
+        self._asks = []
+        self._active = {}
+        self._seq = itertools.count()
+        self._changes = []
+
+    def __len__(self):
+        return len(self._active)
+
+    def get_order(self, player_id):
+        return self._active.get(player_id)
+
+    def cancel(self, player_id):
+        order = self._active.pop(player_id, None)
+        if order is not None:
+            self._record(order, -1)
+            self._compact_if_needed()
+        return order
+
+    def submit(self, player_id, is_buy, price, quantity=1):
+        """Returns a list of Fills. Whatever is not filled rests in the book."""
+        self.cancel(player_id)
+        order = Order(player_id, is_buy, price, quantity, next(self._seq))
+        fills = []
+        opposite = self._asks if is_buy else self._bids
+        while order.quantity > 0:
+            best = self._peek(opposite)
+            if best is None or not _crosses(order, best):
+                break
+            qty = min(order.quantity, best.quantity)
+            if is_buy:
+                fills.append(Fill(order.player_id, best.player_id, order.price, qty))
+            else:
+                fills.append(Fill(best.player_id, order.player_id, best.price, qty))
+            order.quantity -= qty
+            best.quantity -= qty
+            if best.quantity == 0:
+                heapq.heappop(opposite)
+                del self._active[best.player_id]
+                self._record(best, -1)
+        if order.quantity > 0:
+            self.add(order)
+        return fills
+
+    def add(self, order: Order):
+        """Put an order in the book without matching it."""
+        self._active[order.player_id] = order
+        self._record(order, 1)
+        if order.is_buy:
+            heapq.heappush(self._bids, (-order.price, order.seq, order))
+        else:
+            heapq.heappush(self._asks, (order.price, order.seq, order))
+
+    def pop_changes(self):
+        """
+        Returns the orders that entered or left the book since the last call,
+        as ['bid' or 'ask', price, +1 or -1]
+        """
+        changes = self._changes
+        self._changes = []
+        return changes
+
+    def _record(self, order, delta):
+        self._changes.append(['bid' if order.is_buy else 'ask', order.price, delta])
+
+    def best_bid(self):
+        return self._peek(self._bids)
+
+    def best_ask(self):
+        return self._peek(self._asks)
+
+    def bids(self):
+        """Resting bid prices, best first"""
+        return [e[2].price for e in sorted(self._bids) if self._is_live(e[2])]
+
+    def asks(self):
+        """Resting ask prices, best first"""
+        return [e[2].price for e in sorted(self._asks) if self._is_live(e[2])]
+
+    def _is_live(self, order):
+        return self._active.get(order.player_id) is order
+
+    def _peek(self, heap):
+        while heap and not self._is_live(heap[0][2]):
+            heapq.heappop(heap)
+        if heap:
+            return heap[0][2]
+
+    def _compact_if_needed(self):
+        # stale entries are normally popped lazily, but if players keep
+        # replacing offers that are far from the top, they would pile up.
+        if len(self._bids) + len(self._asks) > 2 * len(self._active) + 64:
+            self._bids = [e for e in self._bids if self._is_live(e[2])]
+            self._asks = [e for e in self._asks if self._is_live(e[2])]
+            heapq.heapify(self._bids)
+            heapq.heapify(self._asks)
+
+
+def _crosses(incoming: Order, resting: Order):
+    if incoming.is_buy:
+        return resting.price <= incoming.price
+    return resting.price >= incoming.price
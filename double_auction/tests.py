@@ -0,0 +1,191 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+import asyncio
+import json
+import random
+import live_methods
+from otree.database import db
+from live_methods import replay_live_messages
+from . import *
+
+NUM_RANDOM_MESSAGES = 300
+
+
+def scripted_messages(group: Group):
+    buyer = group.get_player_by_id(1)
+    seller = group.get_player_by_id(2)
+    # on page load
+    for p in group.get_players():
+        yield p.id_in_group, {}
+    yield seller.id_in_group, dict(offer=Constants.valuation_max)
+    # too low to trade
+    yield buyer.id_in_group, dict(offer=1)
+    retval = yield seller.id_in_group, dict(offer=seller.break_even_point)
+    expect(retval[0]['trades'], [])
+    retval = yield buyer.id_in_group, dict(offer=Constants.valuation_max)
+    expect(len(retval[0]['trades']), 1)
+    # not a number
+    yield buyer.id_in_group, dict(offer='abc')
+
+
+def random_messages(group: Group):
+    # seeded, so that each run sends the same messages
+    rng = random.Random(group.id_in_subsession)
+    players = group.get_players()
+    market = Market.for_group(group)
+    for i in range(NUM_RANDOM_MESSAGES):
+        p = rng.choice(players)
+        trader = market.traders[p.id_in_group]
+        if rng.random() < 0.1:
+            # e.g. the page was reloaded
+            yield p.id_in_group, {}
+        elif trader.is_buyer:
+            offer = rng.randint(Constants.valuation_min, trader.break_even_point)
+            yield p.id_in_group, dict(offer=offer)
+        else:
+            offer = rng.randint(trader.break_even_point, Constants.valuation_max)
+            yield p.id_in_group, dict(offer=offer)
+
+
+def is_scripted(case, group: Group):
+    # the script needs a buyer and a seller. with a different number of
+    # participants, the last group can be smaller.
+    return case == 'scripted' and len(group.get_players()) >= 2
+
+
+def is_on_trading_page(player: Player):
+    from otree.lookup import get_page_lookup
+
+    participant = player.participant
+    lookup = get_page_lookup(participant._session_code, participant._index_in_pages)
+    return lookup.page_class == Trading
+
+
+async def send_too_fast(player: Player, capacity):
+    """
+    Like on the server, where the live method runs in the event loop,
+    so a message over the limit is held back until the limit allows.
+    """
+    market = Market.for_group(player.group)
+    trader = market.traders[player.id_in_group]
+    # the book is empty, so this doesn't trade
+    offer = 1 if trader.is_buyer else Constants.valuation_max
+    # a burst of up to capacity messages goes through,
+    # or a few more, since the bucket refills while they are processed
+    for num_sent in range(1, capacity * 2):
+        reply = live_method(player, {})[player.id_in_group]
+        if 'slow_down' in reply:
+            break
+    expect(num_sent, '>', capacity)
+    expect(reply['slow_down'], True)
+    # merged into the message that is held back
+    expect(live_method(player, dict(offer=offer)), None)
+    expect(trader.current_offer, '!=', offer)
+
+    await asyncio.sleep(reply['retry_ms'] / 1000 + 0.1)
+    expect(player.participant.code in live_methods.PENDING_MESSAGES, False)
+    expect(trader.current_offer, offer)
+
+
+def check_rate_limit(group: Group):
+    # the player whose bot is about to submit the page. the others may still be
+    # on the wait page, where their messages would be ignored.
+    player = [p for p in group.get_players() if is_on_trading_page(p)][0]
+    rate = 10
+    # this case's session isn't used for anything else, so it's not reset after.
+    # the message that is held back is processed in its own database session,
+    # so the config has to be saved, which only happens when it's reassigned.
+    session = group.session
+    session.config = dict(session.config, live_messages_per_second=rate)
+    db.commit()
+    asyncio.run(send_too_fast(player, rate * live_methods.RATE_LIMIT_BURST_SECONDS))
+
+
+class RecordingSocket:
+    """Subscribed to a participant's live page channel, in place of their browser"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+
+async def trade_twice_in_1_tick(group: Group, tick_ms):
+    """
+    Like on the server, where the live method runs in the event loop,
+    so the broadcasts are held back until the end of the tick, and merged.
+    """
+    from otree.channels.utils import channel_layer, live_group
+
+    buyers = [p for p in group.get_players() if p.is_buyer][:2]
+    seller = [p for p in group.get_players() if not p.is_buyer][0]
+    # the broadcast goes to the page of the player who sent the 1st message,
+    # which the seller would be on too (here, they may still be on the wait page)
+    sender = buyers[0].participant
+    socket = RecordingSocket()
+    channel = live_group(
+        sender._session_code, sender._index_in_pages, seller.participant.code
+    )
+    channel_layer.add(channel, socket)
+    try:
+        for buyer in buyers:
+            expect(live_method(buyer, dict(offer=Constants.valuation_max)), None)
+            retval = live_method(seller, dict(offer=Constants.production_costs_min))
+            expect(retval, None)
+        await asyncio.sleep(tick_ms / 1000 + 0.1)
+    finally:
+        channel_layer.discard(channel, socket)
+
+    [update] = socket.messages
+    expect(update['from_seq'], update['seq'] - 3)
+    expect(len(update['trades']), 2)
+    expect(
+        [(news['buyer'], news['seller']) for news in update['news']],
+        [(buyer.id_in_group, seller.id_in_group) for buyer in buyers],
+    )
+    expect(update['players'][str(seller.id_in_group)]['num_items'], 1)
+
+
+def check_tick(group: Group):
+    tick_ms = 100
+    # this case's session isn't used for anything else, so it's not reset after.
+    session = group.session
+    session.config = dict(session.config, live_tick_ms=tick_ms)
+    asyncio.run(trade_twice_in_1_tick(group, tick_ms))
+
+
+def call_live_method(method, group: Group, case, **kwargs):
+    if case == 'rate_limit':
+        check_rate_limit(group)
+        return
+    scripted = is_scripted(case, group)
+    if case == 'tick':
+        check_tick(group)
+    else:
+        if scripted:
+            script = scripted_messages(group)
+        else:
+            script = random_messages(group)
+        replay_live_messages(method, group, script)
+
+    # the market is saved in the background
+    Market.for_group(group).flush(group)
+    players = group.get_players()
+    num_sold = sum(p.num_items for p in players if p.is_buyer)
+    expect(len(Transaction.filter(group=group)), num_sold)
+    # items are only moved from sellers to buyers
+    expect(
+        sum(p.num_items for p in players),
+        Constants.items_per_seller * len([p for p in players if not p.is_buyer]),
+    )
+    if scripted:
+        expect(num_sold, 1)
+
+
+class PlayerBot(Bot):
+
+    cases = ['scripted', 'random', 'rate_limit', 'tick']
+
+    def play_round(self):
+        yield Submission(Trading, timeout_happened=True, check_html=False)
+        yield Submission(Results, check_html=False)
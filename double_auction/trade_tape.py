@@ -0,0 +1,38 @@
+from array import array
+
+
+class TradeTape:
+    """
+    Append-only record of a group's trades, for drawing charts.
+    Seconds and prices are stored in 2 compact int arrays that are used as a
+    ring buffer, so if there are more than `capacity` trades, the oldest
+    ones are dropped from the tape (they are still in the database).
+    """
+
+    def __init__(self, capacity=10_000):
+        self.capacity = capacity
+        self._seconds = array('i', bytes(4 * capacity))
+        self._prices = array('i', bytes(4 * capacity))
+        # total number of trades ever appended
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, seconds, price):
+        i = self._count % self.capacity
+        self._seconds[i] = int(seconds)
+        self._prices[i] = int(price)
+        self._count += 1
+
+    def _indexes(self):
+        if self._count <= self.capacity:
+            return range(self._count)
+        start = self._count % self.capacity
+        return [(start + i) % self.capacity for i in range(self.capacity)]
+
+    def series(self):
+        """[[seconds, price], ...] in the order the trades happened"""
+        seconds = self._seconds
+        prices = self._prices
+        return [[seconds[i], prices[i]] for i in self._indexes()]
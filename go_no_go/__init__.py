@@ -1,4 +1,10 @@
 from otree.api import *
+import rt_stats
+import rt_timing
+import table_export
+from shared_out import get_stimuli, encode_trial_order, decode_trial_order
+from live_methods import drop_duplicates
+from instrumentation import instrument
 
 doc = """
 """
@@ -10,48 +16,169 @@ class Constants(BaseConstants):
     num_rounds = 1
     red_images = [0, 4, 8, 17]
     num_images = 10  # actually there are 20 images but we just show 10 for brevity
+    # for the admin report, reaction times more than this many SDs from the
+    # player's mean are treated as outliers
+    outlier_sd = 2.5
 
 
 class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     for p in subsession.get_players():
         participant = p.participant
+        # Trial rows are created when the player responds, not here.
         image_ids = generate_ordering()
-        for stim in image_ids:
-            is_red = stim in Constants.red_images
-            Trial.create(player=p, image_id=stim, is_red=is_red)
+        p.trial_order = encode_trial_order(image_ids)
 
         participant.reaction_times = []
 
 
+def vars_for_admin_report(subsession: Subsession):
+    # load just the columns we need for all trials in 1 query
+    rows = (
+        Trial.objects_filter()
+        .join(Player)
+        .filter(Player.subsession_id == subsession.id)
+        .with_entities(
+            Trial.player_id, Trial.reaction_ms, Trial.is_error, Trial.is_janky
+        )
+        .all()
+    )
+    player_ids = [row[0] for row in rows]
+    reaction_ms = [row[1] for row in rows]
+    is_error = [row[2] for row in rows]
+    num_janky = sum(bool(row[3]) for row in rows)
+
+    stats_by_player = rt_stats.summarize_by_player(
+        player_ids, reaction_ms, is_error=is_error, trim_sd=Constants.outlier_sd
+    )
+    player_stats = []
+    for p in subsession.get_players():
+        if p.id in stats_by_player:
+            player_stats.append(
+                dict(
+                    rt_stats.for_display(stats_by_player[p.id]),
+                    id_in_subsession=p.id_in_subsession,
+                )
+            )
+    session_stats = rt_stats.summarize(
+        reaction_ms, is_error=is_error, trim_sd=Constants.outlier_sd
+    )
+    return dict(
+        player_stats=player_stats,
+        session_stats=rt_stats.for_display(session_stats),
+        outlier_sd=Constants.outlier_sd,
+        num_janky=num_janky,
+    )
+
+
 class Group(BaseGroup):
     pass
 
 
 class Player(BasePlayer):
+    trial_order = models.StringField(
+        doc="Image IDs in the order they are shown to the player, as hex bytes"
+    )
     num_completed = models.IntegerField(initial=0)
     num_errors = models.IntegerField(initial=0)
     avg_reaction_ms = models.FloatField()
 
 
-def get_current_trial(player: Player):
-    return Trial.filter(player=player, is_error=None)[0]
+def get_current_image_id(player: Player):
+    # num_completed is a cursor into the trial order,
+    # so we don't need to query the trials to know which one is next.
+    return decode_trial_order(player.trial_order)[player.num_completed]
+
+
+def get_reaction_times(player: Player):
+    """
+    Each reaction time is saved in its Trial row as the response arrives,
+    so participant.reaction_times is filled in once the task is done,
+    with 1 query, rather than being rewritten on every trial.
+    """
+    rows = (
+        Trial.objects_filter(player=player)
+        .filter(Trial.reaction_ms.isnot(None))
+        .order_by(Trial.id)
+        .with_entities(Trial.reaction_ms)
+    )
+    return [reaction_ms for (reaction_ms,) in rows]
 
 
 def is_finished(player: Player):
     return player.num_completed == Constants.num_images
 
 
+def get_schedule(player: Player):
+    """For batch mode: the image IDs of the remaining trials"""
+    image_ids = decode_trial_order(player.trial_order)
+    return list(image_ids[player.num_completed : Constants.num_images])
+
+
+def score_response(player: Player, image_id, data, received_ms):
+    """Updates the player's totals, and returns the fields of the response's Trial"""
+    is_red = image_id in Constants.red_images
+    pressed = bool(data.get('pressed'))
+    is_error = is_red == pressed
+    reaction_ms = None
+    if is_error:
+        player.num_errors += 1
+    elif not is_red:
+        reaction_ms = rt_timing.get_reaction_ms(data)
+    player.num_completed += 1
+    return dict(
+        image_id=image_id,
+        is_red=is_red,
+        pressed=pressed,
+        is_error=is_error,
+        reaction_ms=reaction_ms,
+        **rt_timing.get_timing(data, received_ms),
+    )
+
+
+def record_batch(player: Player, responses, received_ms):
+    """
+    In batch mode, the browser runs the trials by itself, and sends the responses
+    to all of them at the end. Returns False if they don't match the schedule.
+    """
+    schedule = get_schedule(player)
+    if not isinstance(responses, list) or len(responses) != len(schedule):
+        return False
+    for image_id, data in zip(schedule, responses):
+        if not isinstance(data, dict) or data.get('image_id') != image_id:
+            return False
+    for image_id, data in zip(schedule, responses):
+        fields = score_response(player, image_id, data, received_ms)
+        Trial.create(player=player, **fields)
+    return True
+
+
 class Trial(ExtraModel):
     player = models.Link(Player)
-    reaction_ms = models.IntegerField()
+    reaction_ms = models.FloatField(
+        doc="From the frame the stimulus was shown in, to the key press"
+    )
     image_id = models.IntegerField()
     is_red = models.BooleanField()
     is_error = models.BooleanField()
     pressed = models.BooleanField()
+    server_received_ms = models.FloatField(
+        doc="Server clock (ms since the epoch) when the response arrived"
+    )
+    clock_offset_ms = models.FloatField(
+        doc="Estimated server clock minus browser clock, in ms"
+    )
+    frame_ms = models.FloatField(doc="Duration of the frame the stimulus was shown in")
+    input_lag_ms = models.FloatField(
+        doc="Time between the key press and the page handling it"
+    )
+    is_janky = models.BooleanField(
+        doc="The browser was too busy for this trial's timing to be reliable"
+    )
 
 
 def generate_ordering():
@@ -62,6 +189,40 @@ def generate_ordering():
     return numbers
 
 
+def export_query():
+    """All trials of all sessions, for table_export"""
+    from otree.models import Participant, Session
+
+    return (
+        Trial.objects_filter()
+        .join(Player)
+        .join(Participant, Player.participant_id == Participant.id)
+        .join(Session, Player.session_id == Session.id)
+        .order_by(Trial.id)
+        .with_entities(
+            Session.code.label('session_code'),
+            Participant.code.label('participant_code'),
+            Player.round_number.label('round_number'),
+            Trial.image_id,
+            Trial.is_red,
+            Trial.pressed,
+            Trial.is_error,
+            Trial.reaction_ms,
+            Trial.server_received_ms,
+            Trial.clock_offset_ms,
+            Trial.frame_ms,
+            Trial.input_lag_ms,
+            Trial.is_janky,
+        )
+    )
+
+
+def custom_export(players):
+    # the trials are streamed directly from the database rather than
+    # being looked up player by player.
+    yield from table_export.iter_rows(export_query())
+
+
 # PAGES
 class Introduction(Page):
     pass
@@ -69,51 +230,67 @@ class Introduction(Page):
 
 class Task(Page):
     @staticmethod
+    @instrument
+    @drop_duplicates
     def live_method(player: Player, data):
-        participant = player.participant
+        received_ms = rt_timing.server_time_ms()
+        batch_mode = player.session.config.get('rt_batch_mode')
+        feedback = ''
+        if 'responses' in data:
+            if batch_mode and record_batch(player, data['responses'], received_ms):
+                return {player.id_in_group: dict(is_finished=True)}
+            print('invalid batch received from participant', player.participant.code)
+            # reply as if the page just loaded: with the schedule again
+            # (or the current trial, if not in batch mode), so the page can recover
+            data = {}
+
         if 'pressed' in data:
-            trial = get_current_trial(player)
-            # this is necessary because the timeout will cause duplicates to be sent
-            if data['image_id'] != trial.image_id:
+            if is_finished(player):
                 return
-            trial.is_error = trial.is_red == data['pressed']
-            if trial.is_error:
-                feedback = '✗'
-                player.num_errors += 1
-            else:
-                feedback = '✓'
-                if not trial.is_red:
-                    trial.reaction_ms = data['answered_timestamp'] - data['displayed_timestamp']
-                    participant.reaction_times.append(trial.reaction_ms)
-            player.num_completed += 1
-        else:
-            feedback = ''
+            # the timeout will cause duplicates to be sent.
+            # drop_duplicates drops them, except after a server restart.
+            image_id = get_current_image_id(player)
+            if data['image_id'] != image_id:
+                return
+            trial = Trial.create(
+                player=player, **score_response(player, image_id, data, received_ms)
+            )
+            feedback = '✗' if trial.is_error else '✓'
+        elif batch_mode and not is_finished(player):
+            return {
+                player.id_in_group: dict(
+                    schedule=get_schedule(player),
+                    # so that the browser can show the feedback by itself
+                    red_images=Constants.red_images,
+                    server_ms=received_ms,
+                )
+            }
 
         if is_finished(player):
             return {player.id_in_group: dict(is_finished=True)}
 
-        trial = get_current_trial(player)
         return {
-            player.id_in_group: dict(image_id=trial.image_id, feedback=feedback, trialId=trial.id)
+            player.id_in_group: dict(
+                image_id=get_current_image_id(player),
+                feedback=feedback,
+                server_ms=received_ms,
+            )
         }
 
     @staticmethod
     def vars_for_template(player: Player):
-        image_paths = [
-            'go_no_go/{}.png'.format(image_id) for image_id in range(Constants.num_images)
-        ]
-
-        return dict(image_paths=image_paths)
+        return get_stimuli('go_no_go', Constants.num_images)
 
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
         participant = player.participant
-        import statistics
+
+        participant.reaction_times = get_reaction_times(player)
 
         # if the participant never pressed, this list will be empty
         if participant.reaction_times:
-            avg_reaction = statistics.mean(participant.reaction_times)
-            player.avg_reaction_ms = int(avg_reaction)
+            stats = rt_stats.summarize(participant.reaction_times)
+            player.avg_reaction_ms = int(stats['mean'])
 
 
 def get_or_none(obj, fieldname):
@@ -0,0 +1,98 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+import random
+from live_methods import replay_live_messages
+from . import *
+
+
+def response(image_id, pressed, reaction_ms):
+    # the fields that rt_timing.js sends; without a key press, there is no answer time
+    data = dict(
+        image_id=image_id,
+        pressed=pressed,
+        displayed_timestamp=1000.0,
+        frame_ms=16.7,
+        clock_offset_ms=0.0,
+    )
+    if pressed:
+        data.update(answered_timestamp=1000.0 + reaction_ms, input_lag_ms=1.0)
+    return data
+
+
+def scripted_messages(player: Player):
+    """presses for every image that isn't red, after 400 ms"""
+    my_id = player.id_in_group
+    # on page load
+    retval = yield my_id, {}
+    while not retval[my_id].get('is_finished'):
+        image_id = retval[my_id]['image_id']
+        pressed = image_id not in Constants.red_images
+        # numbered like live_seq.js does
+        seq = player.num_completed + 1
+        retval = yield my_id, dict(response(image_id, pressed, 400), seq=seq)
+        expect(retval[my_id]['last_seq'], seq)
+        if player.num_completed == 1:
+            # the timeout also answers the same image, which is ignored
+            timeout = dict(response(image_id, False, 0), seq=seq)
+            duplicate_retval = yield my_id, timeout
+            expect(duplicate_retval, None)
+
+
+def random_messages(player: Player):
+    # seeded, so that each run sends the same messages
+    rng = random.Random(player.id_in_subsession)
+    my_id = player.id_in_group
+    retval = yield my_id, {}
+    while not retval[my_id].get('is_finished'):
+        image_id = retval[my_id]['image_id']
+        pressed = rng.random() < 0.7
+        retval = yield my_id, response(image_id, pressed, rng.gauss(450, 100))
+
+
+def batch_messages(player: Player):
+    """like scripted_messages, but all answers in 1 message, as in rt_batch_mode"""
+    my_id = player.id_in_group
+    config = player.session.config
+    responses = [
+        response(image_id, image_id not in Constants.red_images, 400)
+        for image_id in get_schedule(player)
+    ]
+    # without rt_batch_mode, the batch is rejected, and the reply is the current trial
+    config['rt_batch_mode'] = False
+    retval = yield my_id, dict(responses=responses)
+    expect(retval[my_id]['image_id'], get_current_image_id(player))
+    expect(player.num_completed, 0)
+
+    config['rt_batch_mode'] = True
+    retval = yield my_id, {}
+    expect(retval[my_id]['schedule'], get_schedule(player))
+    # one missing, so it's rejected, and the reply is the schedule again
+    retval = yield my_id, dict(responses=responses[:-1])
+    expect(retval[my_id]['schedule'], get_schedule(player))
+    retval = yield my_id, dict(responses=responses)
+    expect(retval[my_id]['is_finished'], True)
+
+
+def call_live_method(method, group: Group, case, **kwargs):
+    # players_per_group is None, so all players are in 1 group
+    for player in group.get_players():
+        if case == 'scripted':
+            script = scripted_messages(player)
+        elif case == 'batch':
+            script = batch_messages(player)
+        else:
+            script = random_messages(player)
+        replay_live_messages(method, group, script)
+        expect(player.num_completed, Constants.num_images)
+
+
+class PlayerBot(Bot):
+
+    cases = ['scripted', 'random', 'batch']
+
+    def play_round(self):
+        yield Introduction
+        yield Submission(Task, check_html=False)
+        if self.case in ['scripted', 'batch']:
+            expect(self.player.num_errors, 0)
+            expect(self.player.avg_reaction_ms, 400)
+        yield Submission(Results, check_html=False)
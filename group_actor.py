@@ -0,0 +1,100 @@
+"""
+In-memory state for live pages where every message changes the same rows:
+double_auction's offers and dollar_auction's bids.
+
+Each group's state is owned by 1 actor object, which is the only thing that
+changes it. The live method applies each message to the actor in memory,
+in the order the messages arrive (oTree handles live messages one at a time),
+and the actor writes a snapshot of its state to the database in the background,
+at most once every live_save_ms (session config), however many messages
+arrived in the meantime. So a busy group costs CPU rather than a database
+write per message.
+
+If the server restarts before a snapshot is saved, up to live_save_ms of
+changes are lost, so keep it short (e.g. 1000).
+0 (the default) saves during each message, as if there were no actor.
+
+Anything that reads the state from the database (e.g. a wait page that
+calculates payoffs) must call flush(group) or close(group) first.
+"""
+
+import asyncio
+import traceback
+
+# keyed by (actor class, group ID), since each app has its own group IDs
+ACTORS = {}
+
+
+class GroupActor:
+    """
+    Subclasses define load(group), which sets the state from the database,
+    and save(group), which writes it back.
+    After changing the state, call changed(group).
+    """
+
+    def __init__(self, group):
+        self.group_id = group.id
+        self.Group = type(group)
+        self.save_ms = group.session.config.get('live_save_ms')
+        self.dirty = False
+        self.save_scheduled = False
+        self.load(group)
+
+    @classmethod
+    def for_group(cls, group):
+        key = (cls, group.id)
+        actor = ACTORS.get(key)
+        if actor is None:
+            actor = ACTORS[key] = cls(group)
+        return actor
+
+    @classmethod
+    def get_open(cls, group):
+        """The group's actor if it has one, without creating it (e.g. for reports)"""
+        return ACTORS.get((cls, group.id))
+
+    @classmethod
+    def close(cls, group):
+        """Saves the state, and frees the memory, e.g. when the live page is over."""
+        actor = ACTORS.pop((cls, group.id), None)
+        if actor:
+            actor.flush(group)
+
+    def load(self, group):
+        raise NotImplementedError
+
+    def save(self, group):
+        raise NotImplementedError
+
+    def flush(self, group):
+        if self.dirty:
+            self.save(group)
+            self.dirty = False
+
+    def changed(self, group):
+        self.dirty = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # e.g. command line bots
+            loop = None
+        if not (self.save_ms and loop):
+            self.flush(group)
+        elif not self.save_scheduled:
+            self.save_scheduled = True
+            loop.create_task(self._save_later())
+
+    async def _save_later(self):
+        from otree.database import session_scope
+        from otree.middleware import lock2
+
+        await asyncio.sleep(self.save_ms / 1000)
+        # the same lock as oTree's requests and live messages,
+        # so the state doesn't change while it's being saved.
+        async with lock2:
+            self.save_scheduled = False
+            try:
+                with session_scope():
+                    self.flush(self.Group.objects_get(id=self.group_id))
+            except Exception:
+                traceback.print_exc()
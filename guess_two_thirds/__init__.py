@@ -1,5 +1,11 @@
 from otree.api import *
 from shared_out import set_players_per_group, get_or_none
+from report_aggregates import (
+    get_report_aggregates,
+    update_report_aggregates,
+    admin_report_socket_url,
+)
+from instrumentation import instrument
 
 
 doc = """
@@ -11,7 +17,7 @@ See https://en.wikipedia.org/wiki/Guess_2/3_of_the_average
 
 
 class Constants(BaseConstants):
-    players_per_group = 3
+    players_per_group = None
     num_rounds = 3
     name_in_url = 'guess_two_thirds'
     jackpot = Currency(100)
@@ -24,38 +30,47 @@ class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     set_players_per_group(subsession)
 
 
+def record_guesses(aggregates, group):
+    if get_or_none(group, 'two_thirds_avg') == None:
+        return False
+    for p in group.get_players():
+        aggregates.stats['guess'].add(p.guess)
+        aggregates.series['guesses'].append(p.guess)
+    return True
+
+
 def vars_for_admin_report(subsession: Subsession):
-    guesses = [
-        p.guess for p in subsession.get_players() if get_or_none(p, 'guess') != None
-    ]
+    guess_stats = get_report_aggregates(subsession, record_guesses).stats['guess']
 
     all_guesses = []
     for ss in subsession.in_all_rounds():
-        round_guesses = [
-            p.guess for p in ss.get_players() if get_or_none(p, 'guess') != None
-        ]
+        round_guesses = get_report_aggregates(ss, record_guesses).series['guesses']
         all_guesses.append(
             {'name': 'Round {}'.format(ss.round_number), 'data': round_guesses}
         )
 
-    if guesses:
+    if guess_stats.count:
         return dict(
+            live_report_url=admin_report_socket_url(subsession),
             guess_exists=True,
-            avg_guess=sum(guesses) / len(guesses),
-            two_thirds_avg_guess=(2 * (sum(guesses) / len(guesses)) / 3),
-            min_guess=min(guesses),
-            max_guess=max(guesses),
+            avg_guess=guess_stats.mean,
+            two_thirds_avg_guess=(2 * guess_stats.mean / 3),
+            min_guess=guess_stats.min,
+            max_guess=guess_stats.max,
             all_guesses=all_guesses,
             players=[
-                'Player {}'.format(i) for i in range(1, Constants.players_per_group + 1)
+                'Player {}'.format(i)
+                for i in range(1, subsession.session.num_participants + 1)
             ],
         )
     else:
         return dict(
+            live_report_url=admin_report_socket_url(subsession),
             guess_exists=False,
             avg_guess='(no data)',
             two_thirds_avg_guess='(no data)',
@@ -80,6 +95,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     players = group.get_players()
     guesses = [p.guess for p in players]
@@ -91,6 +107,7 @@ def set_payoffs(group: Group):
     for p in winners:
         p.is_winner = True
         p.payoff = Constants.jackpot / group.num_winners
+    update_report_aggregates(group, record_guesses)
 
 
 def two_thirds_avg_history(group: Group):
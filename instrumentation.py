@@ -0,0 +1,348 @@
+"""
+Opt-in instrumentation of the callbacks where the server does its work during
+class: live methods, after_all_players_arrive and creating_session.
+Decorate them with @instrument (outside any other decorator, and inside
+@staticmethod), then start the server with OTREE_INSTRUMENT set:
+
+    OTREE_INSTRUMENT=1 otree prodserver 8000
+
+For each call, this records:
+-   wall time
+-   number of database queries
+-   rows touched: objects loaded from the database,
+    plus rows inserted, updated or deleted (including changes that are only
+    written when the request commits)
+-   payload bytes: the size of the JSON a live method returns
+
+The results are served at:
+-   /instrumentation/metrics: counters and histograms in the Prometheus text format,
+    labelled by app and callback.
+-   /instrumentation/<session code>: a summary of the session's callbacks,
+    slowest first, to find out which ones to optimize.
+If AUTH_LEVEL is set, these need the admin login, like oTree's admin pages,
+or the otree-rest-key header, like oTree's REST API.
+
+Without OTREE_INSTRUMENT, @instrument returns the function unchanged,
+so it costs nothing.
+
+Separately, with OTREE_COUNT_QUERIES set, each HTTP response has a header
+saying how many database queries the request made (see load_test.py).
+"""
+
+import functools
+import html
+import json
+import os
+import time
+from collections import defaultdict
+
+ENABLED = bool(os.environ.get('OTREE_INSTRUMENT'))
+URL_PREFIX = '/instrumentation/'
+# for load_test.py: each HTTP response says how many database queries it made
+COUNT_QUERIES = bool(os.environ.get('OTREE_COUNT_QUERIES'))
+DB_QUERIES_HEADER = 'X-DB-Queries'
+
+# upper bounds of the histogram buckets
+SECONDS_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+QUERIES_BUCKETS = [0, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 1 more for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.total += value
+
+
+class CallbackStats:
+    """Totals for 1 callback, in 1 session or in all of them"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = Histogram(SECONDS_BUCKETS)
+        self.queries = Histogram(QUERIES_BUCKETS)
+        self.max_seconds = 0
+        self.rows = 0
+        self.payload_bytes = 0
+
+    def add(self, seconds, queries, rows, payload_bytes):
+        self.calls += 1
+        self.seconds.observe(seconds)
+        self.queries.observe(queries)
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        self.payload_bytes += payload_bytes
+
+
+# keyed by (app name, callback name)
+TOTALS = defaultdict(CallbackStats)
+# keyed by session ID, then (app name, callback name)
+SESSION_TOTALS = defaultdict(lambda: defaultdict(CallbackStats))
+
+
+class Counters:
+    """Running totals of database activity, updated by SQLAlchemy events"""
+
+    queries = 0
+    rows = 0
+
+
+def _count_query(*args, **kwargs):
+    Counters.queries += 1
+
+
+def _count_load(target, context):
+    Counters.rows += 1
+
+
+def _count_flush(session, flush_context, instances):
+    Counters.rows += _num_pending(session)
+
+
+def _num_pending(session):
+    """rows that will be written at the next flush"""
+    return (
+        len(session.new)
+        + len(session.deleted)
+        + sum(1 for obj in session.dirty if session.is_modified(obj))
+    )
+
+
+def _get_session_id(obj):
+    # the first argument is a player, group or subsession, which all have this column.
+    # reading the ID doesn't need a query, unlike obj.session.
+    return getattr(obj, 'session_id', None)
+
+
+def _payload_size(retval):
+    if retval is None:
+        return 0
+    return len(json.dumps(retval, default=str))
+
+
+def instrument(callback):
+    if not ENABLED:
+        return callback
+
+    # e.g. ResultsWaitPage.after_all_players_arrive, since an app can have several
+    key = (callback.__module__, callback.__qualname__)
+
+    @functools.wraps(callback)
+    def wrapper(*args, **kwargs):
+        from otree.database import db
+
+        # oTree passes the group or subsession to after_all_players_arrive by keyword
+        obj = args[0] if args else next(iter(kwargs.values()))
+
+        pending_before = _num_pending(db._db)
+        queries_before = Counters.queries
+        rows_before = Counters.rows
+        start = time.perf_counter()
+        retval = callback(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        # changes that weren't flushed yet are written when the request commits
+        pending = max(0, _num_pending(db._db) - pending_before)
+        rows = Counters.rows - rows_before + pending
+        queries = Counters.queries - queries_before
+        payload_bytes = _payload_size(retval)
+        for totals in [TOTALS, SESSION_TOTALS[_get_session_id(obj)]]:
+            totals[key].add(seconds, queries, rows, payload_bytes)
+        return retval
+
+    return wrapper
+
+
+def _format_labels(key, **extra):
+    app_name, callback_name = key
+    labels = dict(app=app_name, callback=callback_name, **extra)
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _format_histogram(lines, metric, key, histogram: Histogram):
+    cumulative = 0
+    for upper_bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+        cumulative += count
+        labels = _format_labels(key, le=upper_bound)
+        lines.append(f'{metric}_bucket{{{labels}}} {cumulative}')
+    labels = _format_labels(key)
+    lines.append(f'{metric}_sum{{{labels}}} {histogram.total}')
+    lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+
+
+def format_metrics():
+    """All sessions' totals, in the Prometheus text format"""
+    lines = []
+    histograms = [
+        ('otree_callback_seconds', 'Wall time per call', 'seconds'),
+        ('otree_callback_db_queries', 'Database queries per call', 'queries'),
+    ]
+    for metric, help_text, attr in histograms:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        for key, stats in TOTALS.items():
+            _format_histogram(lines, metric, key, getattr(stats, attr))
+    counters = [
+        ('otree_callback_rows_total', 'Database rows loaded or written', 'rows'),
+        (
+            'otree_callback_payload_bytes_total',
+            'JSON returned by live methods',
+            'payload_bytes',
+        ),
+    ]
+    for metric, help_text, attr in counters:
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} counter')
+        for key, stats in TOTALS.items():
+            lines.append(f'{metric}{{{_format_labels(key)}}} {getattr(stats, attr)}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_session_summary(session_id, session_code):
+    rows = []
+    by_key = SESSION_TOTALS.get(session_id, {})
+    for (app_name, callback_name), stats in sorted(
+        by_key.items(), key=lambda item: -item[1].seconds.total
+    ):
+        cells = [
+            app_name,
+            callback_name,
+            stats.calls,
+            f'{stats.seconds.total:.3f}',
+            f'{stats.seconds.total / stats.calls * 1000:.1f}',
+            f'{stats.max_seconds * 1000:.1f}',
+            f'{stats.queries.total / stats.calls:.1f}',
+            f'{stats.rows / stats.calls:.1f}',
+            f'{stats.payload_bytes / stats.calls:.0f}',
+        ]
+        rows.append(
+            '<tr>' + ''.join(f'<td>{html.escape(str(c))}</td>' for c in cells) + '</tr>'
+        )
+    headers = [
+        'App',
+        'Callback',
+        'Calls',
+        'Total s',
+        'Mean ms',
+        'Max ms',
+        'Queries/call',
+        'Rows/call',
+        'Payload bytes/call',
+    ]
+    return (
+        f'<!DOCTYPE html><title>Instrumentation: {html.escape(session_code)}</title>'
+        f'<h3>Callbacks in session {html.escape(session_code)}</h3>'
+        '<table border="1" cellpadding="4">'
+        '<tr>' + ''.join(f'<th>{h}</th>' for h in headers) + '</tr>'
+        + (''.join(rows) or '<tr><td colspan="9">No calls yet</td></tr>')
+        + '</table>'
+    )
+
+
+def _is_authorized(request):
+    """
+    Like oTree's admin pages: if AUTH_LEVEL is set, you need to be logged in
+    as the admin. A client that can't log in (e.g. a Prometheus server)
+    can instead send the otree-rest-key header, like with oTree's REST API.
+    """
+    from otree import settings
+    from otree.common import AUTH_COOKIE_NAME, AUTH_COOKIE_VALUE
+
+    if not settings.AUTH_LEVEL:
+        return True
+    rest_key = os.environ.get('OTREE_REST_KEY')
+    if rest_key and request.headers.get('otree-rest-key') == rest_key:
+        return True
+    return request.session.get(AUTH_COOKIE_NAME) == AUTH_COOKIE_VALUE
+
+
+async def _load_session(request):
+    """
+    Sets request.session from the cookie, as oTree's SessionMiddleware
+    (configured as in otree/asgi.py) would,
+    since these URLs are answered before the request gets to it.
+    """
+    from otree import middleware
+
+    async def do_nothing(scope, receive, send):
+        pass
+
+    session_middleware = middleware.SessionMiddleware(
+        do_nothing, secret_key=middleware._SECRET
+    )
+    await session_middleware(request.scope, request.receive, None)
+
+
+async def _get_response(request):
+    from starlette.responses import HTMLResponse, PlainTextResponse
+    from otree.models import Session
+
+    await _load_session(request)
+    if not _is_authorized(request):
+        return PlainTextResponse(
+            'Log in as the admin, or send the otree-rest-key header', 403
+        )
+    name = request.url.path[len(URL_PREFIX) :]
+    if name == 'metrics':
+        return PlainTextResponse(
+            format_metrics(), media_type='text/plain; version=0.0.4'
+        )
+    session = Session.objects_filter(code=name).first()
+    if session is None:
+        return PlainTextResponse(f'No session with code {name}', 404)
+    return HTMLResponse(format_session_summary(session.id, session.code))
+
+
+def _count_request_queries(call_next):
+    async def call_next_and_count(request):
+        num_before = Counters.queries
+        response = await call_next(request)
+        response.headers[DB_QUERIES_HEADER] = str(Counters.queries - num_before)
+        return response
+
+    return call_next_and_count
+
+
+def install():
+    """
+    Counts database activity, and wraps oTree's CommitTransactionMiddleware
+    to add the pages under URL_PREFIX and/or the DB_QUERIES_HEADER.
+    oTree handles 1 HTTP request at a time (inside that middleware's lock),
+    so counting there gives each request's own queries,
+    except for live methods that happen to run at the same time.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session as ORMSession
+    from otree.database import engine, AnyModel
+    from otree.middleware import CommitTransactionMiddleware
+
+    event.listen(engine, 'before_cursor_execute', _count_query)
+    if ENABLED:
+        event.listen(AnyModel, 'load', _count_load, propagate=True)
+        event.listen(ORMSession, 'before_flush', _count_flush)
+
+    dispatch = CommitTransactionMiddleware.dispatch
+
+    async def instrumented_dispatch(self, request, call_next):
+        # oTree doesn't have a way for projects to add routes,
+        # so these URLs are answered before the request gets to oTree's router.
+        if ENABLED and request.url.path.startswith(URL_PREFIX):
+            call_next = _get_response
+        if COUNT_QUERIES:
+            call_next = _count_request_queries(call_next)
+        return await dispatch(self, request, call_next)
+
+    CommitTransactionMiddleware.dispatch = instrumented_dispatch
+
+
+if ENABLED or COUNT_QUERIES:
+    install()
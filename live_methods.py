@@ -0,0 +1,324 @@
+"""
+Opt-in decorators for live methods, which can be combined:
+-   live_tick: merges the broadcasts to a group within each tick
+-   rate_limit: holds back and merges messages from a participant who sends too fast
+-   drop_duplicates: drops a message that the page sent again
+
+And replay_live_messages, for call_live_method in tests.py.
+"""
+
+import asyncio
+import functools
+import time
+import traceback
+
+
+def merge_payloads(old, new):
+    """Default way to merge 2 broadcasts in tick mode: the newer values win."""
+    return {**old, **new}
+
+
+# broadcasts waiting for the end of the current tick,
+# keyed by (app name, group ID), since each app has its own group IDs
+PENDING_BROADCASTS = {}
+
+
+def live_tick(merge=merge_payloads):
+    """
+    Opt-in tick mode for live_method.
+    If the session config has live_tick_ms, messages are still processed
+    immediately, but broadcasts to the whole group (return value with key 0)
+    are held back and merged with any other broadcasts in the same tick,
+    so each player gets at most 1 update per tick.
+    Replies to individual players are sent right away.
+    """
+
+    def decorator(live_method):
+        @functools.wraps(live_method)
+        def wrapper(player, data):
+            retval = live_method(player, data)
+            tick_ms = player.session.config.get('live_tick_ms')
+            if not (tick_ms and retval and 0 in retval):
+                return retval
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # e.g. command line bots, which don't use websockets
+                return retval
+            group = player.group
+            key = (live_method.__module__, group.id)
+            pending = PENDING_BROADCASTS.get(key)
+            if pending:
+                pending['payload'] = merge(pending['payload'], retval[0])
+            else:
+                participant = player.participant
+                PENDING_BROADCASTS[key] = dict(
+                    payload=retval[0],
+                    session_code=participant._session_code,
+                    page_index=participant._index_in_pages,
+                    participant_codes=[p.participant.code for p in group.get_players()],
+                )
+                loop.call_later(tick_ms / 1000, _flush_broadcast, key)
+
+        return wrapper
+
+    return decorator
+
+
+def _flush_broadcast(key):
+    pending = PENDING_BROADCASTS.pop(key)
+    asyncio.ensure_future(_send_broadcast(**pending))
+
+
+async def _send_broadcast(payload, session_code, page_index, participant_codes):
+    from otree.channels import utils as channel_utils
+
+    for code in participant_codes:
+        await channel_utils.group_send(
+            group=channel_utils.live_group(session_code, page_index, code),
+            data=payload,
+        )
+
+
+class TokenBucket:
+    """Allows rate messages per second, with bursts of up to capacity messages."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def seconds_until_available(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self):
+        """If so, it's the same as a new bucket"""
+        elapsed = time.monotonic() - self.updated
+        return self.tokens + elapsed * self.rate >= self.capacity
+
+
+# how many seconds' worth of messages can be sent at once
+RATE_LIMIT_BURST_SECONDS = 2
+# keyed by participant code, or (app name, group ID)
+RATE_LIMIT_BUCKETS = {}
+# how often to drop the buckets that are full again,
+# so that buckets of participants who left don't pile up over a long server run
+RATE_LIMIT_PRUNE_SECONDS = 60
+RATE_LIMIT_LAST_PRUNED = time.monotonic()
+# the latest message from each participant who is over the limit,
+# keyed by participant code
+PENDING_MESSAGES = {}
+
+
+def merge_messages(old, new):
+    """
+    Default way to merge 2 messages from a participant who is over the limit:
+    only the latest offer or bid matters,
+    and an empty message (asking for the current state) doesn't replace one,
+    since the reply to it includes the current state.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        return {**old, **new}
+    return new or old
+
+
+def prune_rate_limit_buckets():
+    global RATE_LIMIT_LAST_PRUNED
+
+    RATE_LIMIT_LAST_PRUNED = time.monotonic()
+    for key, bucket in list(RATE_LIMIT_BUCKETS.items()):
+        if bucket.is_full():
+            del RATE_LIMIT_BUCKETS[key]
+
+
+def _get_bucket(key, rate):
+    if time.monotonic() - RATE_LIMIT_LAST_PRUNED > RATE_LIMIT_PRUNE_SECONDS:
+        prune_rate_limit_buckets()
+    bucket = RATE_LIMIT_BUCKETS.get(key)
+    if bucket is None or bucket.rate != rate:
+        bucket = RATE_LIMIT_BUCKETS[key] = TokenBucket(
+            rate, max(1, rate * RATE_LIMIT_BURST_SECONDS)
+        )
+    return bucket
+
+
+def rate_limit(merge=merge_messages):
+    """
+    Opt-in rate limiting for live_method, so that 1 client sending messages
+    in a loop can't slow down the live page for the rest of the class.
+    The session config's live_messages_per_second limits each participant,
+    and live_group_messages_per_second limits each group.
+
+    A message over the limit is held back and processed as soon as the limit
+    allows. If more messages arrive from the same participant in the meantime,
+    they are merged into it. The sender immediately gets
+    {'slow_down': True, 'retry_ms': ...}, which the page should show
+    (see _static/global/slow_down.js).
+    """
+
+    def decorator(live_method):
+        @functools.wraps(live_method)
+        def wrapper(player, data):
+            config = player.session.config
+            rate = config.get('live_messages_per_second')
+            group_rate = config.get('live_group_messages_per_second')
+            if not (rate or group_rate):
+                return live_method(player, data)
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                # e.g. command line bots, which don't use websockets
+                return live_method(player, data)
+
+            participant = player.participant
+            buckets = []
+            if rate:
+                buckets.append(_get_bucket(participant.code, rate))
+            if group_rate:
+                group_key = (live_method.__module__, player.group.id)
+                buckets.append(_get_bucket(group_key, group_rate))
+
+            pending = PENDING_MESSAGES.get(participant.code)
+            if pending is not None:
+                # keep the messages in order: this one waits behind the pending one
+                pending['data'] = merge(pending['data'], data)
+                return
+            wait = max(bucket.seconds_until_available() for bucket in buckets)
+            if not wait:
+                for bucket in buckets:
+                    bucket.take()
+                return live_method(player, data)
+
+            from otree.lookup import get_page_lookup
+
+            page_name = get_page_lookup(
+                participant._session_code, participant._index_in_pages
+            ).page_class.__name__
+            PENDING_MESSAGES[participant.code] = dict(data=data)
+            loop.call_later(wait, _send_pending_message, participant.code, page_name)
+            return {
+                player.id_in_group: dict(slow_down=True, retry_ms=round(wait * 1000))
+            }
+
+        return wrapper
+
+    return decorator
+
+
+def _send_pending_message(participant_code, page_name):
+    asyncio.ensure_future(_process_pending_message(participant_code, page_name))
+
+
+async def _process_pending_message(participant_code, page_name):
+    from otree.database import session_scope
+    from otree.live import live_payload_function
+    from otree.middleware import lock2
+
+    # the same way oTree processes a message when it arrives.
+    # if the participant has moved on to the next page, it's ignored.
+    async with lock2:
+        pending = PENDING_MESSAGES.pop(participant_code)
+        try:
+            with session_scope():
+                await live_payload_function(
+                    participant_code=participant_code,
+                    page_name=page_name,
+                    payload=pending['data'],
+                )
+        except Exception:
+            traceback.print_exc()
+
+
+# the last sequence number processed from each player,
+# keyed by (app name, player ID), since each app has its own player IDs
+LAST_SEQS = {}
+
+
+def drop_duplicates(live_method):
+    """
+    For live pages whose messages must only be processed once
+    (e.g. a response to a trial), even if the page sends one again
+    (a retry on a flaky connection, or a timeout firing after a key press).
+    The page numbers each such message with an increasing 'seq'
+    (see _static/global/live_seq.js), and a message whose seq isn't higher
+    than the last one processed is dropped before the live method runs.
+    Messages without a seq (e.g. asking for the current state) are always processed.
+
+    Replies to the sender include last_seq, so that after a page reload,
+    the page continues the numbering where it left off.
+    The numbers are kept in memory, so after a server restart, the live method's
+    own checks are all that's left.
+    """
+
+    @functools.wraps(live_method)
+    def wrapper(player, data):
+        key = (live_method.__module__, player.id)
+        last_seq = LAST_SEQS.get(key, 0)
+        seq = data.get('seq') if isinstance(data, dict) else None
+        if isinstance(seq, int):
+            if seq <= last_seq:
+                return
+        else:
+            seq = None
+        retval = live_method(player, data)
+        if seq is not None:
+            last_seq = LAST_SEQS[key] = seq
+        reply = retval and retval.get(player.id_in_group)
+        if isinstance(reply, dict):
+            reply['last_seq'] = last_seq
+        return retval
+
+    return wrapper
+
+
+def percentile(sorted_values, p):
+    """nearest-rank percentile"""
+    index = max(0, round(p / 100 * len(sorted_values) + 0.5) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def replay_live_messages(method, group, script):
+    """
+    For call_live_method in tests.py: sends each (id_in_group, data) that script
+    yields to the live method, and times each call.
+    script is a generator. The live method's return value is sent back into it,
+    so it can react to the reply (e.g. answer the image it was just shown).
+
+    If the session config has bot_live_messages_per_second, each bot's group
+    sends messages at that rate, like a class would;
+    otherwise they are sent back to back, which measures the live method's throughput.
+    Returns the durations in ms.
+    """
+    rate = group.session.config.get('bot_live_messages_per_second')
+    durations = []
+    started = time.perf_counter()
+    try:
+        id_in_group, data = next(script)
+        while True:
+            start = time.perf_counter()
+            retval = method(id_in_group, data)
+            durations.append((time.perf_counter() - start) * 1000)
+            if rate:
+                time.sleep(max(0, start + 1 / rate - time.perf_counter()))
+            id_in_group, data = script.send(retval)
+    except StopIteration:
+        pass
+    seconds = time.perf_counter() - started
+    if durations:
+        values = sorted(durations)
+        print(
+            f'{type(group).__module__} group {group.id_in_subsession}: '
+            f'{len(values)} live messages in {seconds:.2f} s, '
+            f'p50={percentile(values, 50):.2f}ms '
+            f'p95={percentile(values, 95):.2f}ms max={values[-1]:.2f}ms'
+        )
+    return durations
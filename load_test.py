@@ -0,0 +1,379 @@
+"""
+Simulates a class of N participants playing each session config at the same
+time against a running server, to find out before class whether it can cope.
+
+Start the server as you would for class (ideally with the same database),
+with OTREE_COUNT_QUERIES set so that the number of database queries per
+request is reported too:
+
+    OTREE_COUNT_QUERIES=1 otree prodserver 8000
+    python load_test.py --participants 400
+    python load_test.py --participants 400 --server http://localhost:8000 stroop go_no_go
+
+If the server has OTREE_REST_KEY set, pass it with --rest-key.
+The live phase needs the server's admin secret code (--admin-secret-code);
+without it, it's computed from this project's SECRET_KEY,
+which is only right if the server uses the same one.
+Only the standard library and oTree's own dependencies are used,
+so this runs wherever oTree is installed.
+
+For each session config there are 2 phases:
+
+1.  Pages: a browser bot session is created, so the PlayerBots in each app's
+    tests.py run on the server and decide what to submit,
+    and 1 thread per participant plays the role of the browser,
+    loading and submitting pages (and polling wait pages) concurrently.
+2.  Live: for session configs with live pages, a regular session is created,
+    each participant skips ahead to the first live page (by submitting pages
+    as timeouts), then sends live messages (see LIVE_MESSAGES) over a websocket,
+    timing how long the reply takes. Apps that broadcast to the group may answer
+    with a reply to a groupmate's message, so this is an approximation.
+
+The report shows p50/p95/p99 latency of page requests and live messages,
+and (if the server counts them) database queries per page request.
+"""
+
+import argparse
+import asyncio
+import html
+import http.cookiejar
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import DB_QUERIES_HEADER
+from live_methods import percentile
+
+# appended to pages when a browser bot should submit them
+AUTO_SUBMIT_MARKER = 'browser-bot-auto-submit'
+WAIT_PAGE_HEADER = 'oTree-Wait-Page'
+WAIT_PAGE_POLL_SECONDS = 1
+MAX_REQUESTS_PER_PARTICIPANT = 500
+LIVE_REPLY_TIMEOUT_SECONDS = 10
+
+# the message each app's live page sends to get the current state.
+# they don't change the game, so they can be sent any number of times.
+LIVE_MESSAGES = {
+    'double_auction': {},
+    'dollar_auction': 0,
+    'nim': 0,
+    'stroop': {},
+    'go_no_go': {},
+}
+
+
+class Timings:
+    """Thread-safe collection of samples, keyed by what was measured"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = []
+
+    def add(self, key, value):
+        with self._lock:
+            self.samples[key].append(value)
+
+    def add_error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def add_response(self, response):
+        # the client follows redirects, and each of them was a request too
+        for resp in response.history + [response]:
+            self.add('page_ms', resp.elapsed_ms)
+            num_queries = resp.headers.get(DB_QUERIES_HEADER)
+            if num_queries is not None:
+                self.add('db_queries', int(num_queries))
+        if response.status_code >= 400:
+            raise Exception(f'{response.status_code} from {response.url}')
+
+
+class Response:
+    def __init__(self, url, status_code, headers, text, elapsed_ms, history):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.elapsed_ms = elapsed_ms
+        # the redirects that led here
+        self.history = history
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        # so that Client can time each redirect as a separate request
+        return None
+
+
+class Client:
+    """Like a browser: keeps cookies, and follows redirects"""
+
+    REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+        cookies = urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        self.opener = urllib.request.build_opener(cookies, _NoRedirects)
+
+    def get(self, url):
+        return self.request(url)
+
+    def post(self, url, data=None, json_payload=None):
+        if json_payload is not None:
+            body = json.dumps(json_payload).encode('utf-8')
+            headers = {'Content-Type': 'application/json'}
+        else:
+            body = urllib.parse.urlencode(data or {}).encode('utf-8')
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        return self.request(url, body, headers)
+
+    def request(self, url, body=None, headers=None):
+        history = []
+        while True:
+            request = urllib.request.Request(
+                url, data=body, headers={**self.headers, **(headers or {})}
+            )
+            start = time.perf_counter()
+            try:
+                resp = self.opener.open(request)
+            except urllib.error.HTTPError as error:
+                # 4xx and 5xx, and redirects, since they aren't followed
+                resp = error
+            with resp:
+                text = resp.read().decode('utf-8', 'replace')
+            response = Response(
+                url,
+                resp.getcode(),
+                resp.headers,
+                text,
+                (time.perf_counter() - start) * 1000,
+                history,
+            )
+            location = resp.headers.get('Location')
+            if response.status_code not in self.REDIRECT_CODES or not location:
+                return response
+            # like a browser, the redirect is followed with a GET
+            history.append(response)
+            url = urllib.parse.urljoin(url, location)
+            body = headers = None
+
+
+class Server:
+    def __init__(self, url, rest_key=None):
+        self.url = url.rstrip('/')
+        self.headers = {}
+        if rest_key:
+            self.headers['otree-rest-key'] = rest_key
+
+    def rest_post(self, path, payload):
+        response = Client(self.headers).post(self.url + path, json_payload=payload)
+        if response.status_code >= 400:
+            raise Exception(f'{response.status_code} from {response.url}')
+        return response
+
+    def get_participant_codes(self, session_code):
+        payload = self.rest_post(f'/api/get_session/{session_code}', {}).json()
+        return [p['code'] for p in payload['participants']]
+
+    def start_url(self, participant_code):
+        return f'{self.url}/InitializeParticipant/{participant_code}'
+
+
+def load_until_not_waiting(client, response, timings):
+    while response.headers.get(WAIT_PAGE_HEADER) == '1':
+        time.sleep(WAIT_PAGE_POLL_SECONDS)
+        response = client.get(response.url)
+        timings.add_response(response)
+    return response
+
+
+def play_browser_bot(server, participant_code, timings):
+    """Loads pages until the bot on the server has nothing more to submit."""
+    client = Client()
+    response = client.get(server.start_url(participant_code))
+    timings.add_response(response)
+    for _ in range(MAX_REQUESTS_PER_PARTICIPANT):
+        response = load_until_not_waiting(client, response, timings)
+        if AUTO_SUBMIT_MARKER not in response.text:
+            return
+        # the server replaces this with the bot's submission
+        response = client.post(response.url, data={})
+        timings.add_response(response)
+    raise Exception(f'{participant_code} did not finish')
+
+
+def run_pages(server, config_name, num_participants, timings):
+    session_code = server.rest_post(
+        '/create_browser_bots_session',
+        dict(
+            session_config_name=config_name,
+            num_participants=num_participants,
+            case_number=None,
+        ),
+    ).text
+    codes = server.get_participant_codes(session_code)
+    with ThreadPoolExecutor(len(codes)) as pool:
+        futures = [
+            pool.submit(play_browser_bot, server, code, timings) for code in codes
+        ]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as exc:
+                timings.add_error(str(exc))
+
+
+LIVE_SOCKET_URL_RE = re.compile(r'id="otree-live" data-socket-url="([^"]+)"')
+APP_NAME_RE = re.compile(r'/p/\w+/(\w+)/')
+
+
+def skip_to_live_page(server, participant_code, admin_secret_code, timings):
+    """Returns (app name, websocket URL), or None if there is no live page."""
+    timeout_data = dict(timeout_happened=True, admin_secret_code=admin_secret_code)
+    client = Client()
+    response = client.get(server.start_url(participant_code))
+    timings.add_response(response)
+    for _ in range(MAX_REQUESTS_PER_PARTICIPANT):
+        response = load_until_not_waiting(client, response, timings)
+        match = LIVE_SOCKET_URL_RE.search(response.text)
+        if match:
+            app_name = APP_NAME_RE.search(response.url).group(1)
+            path = html.unescape(match.group(1))
+            return app_name, re.sub('^http', 'ws', server.url) + path
+        if 'id="form"' not in response.text:
+            return None
+        response = client.post(response.url, data=timeout_data)
+        timings.add_response(response)
+
+
+async def send_live_messages(app_name, socket_url, num_messages, timings):
+    import websockets
+
+    message = json.dumps(LIVE_MESSAGES.get(app_name, {}))
+    async with websockets.connect(socket_url) as socket:
+        for _ in range(num_messages):
+            start = time.perf_counter()
+            await socket.send(message)
+            try:
+                await asyncio.wait_for(socket.recv(), LIVE_REPLY_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                timings.add_error(f'{app_name}: no reply to live message')
+            else:
+                timings.add('live_ms', (time.perf_counter() - start) * 1000)
+
+
+async def send_all_live_messages(live_pages, num_messages, timings):
+    await asyncio.gather(
+        *[
+            send_live_messages(app_name, socket_url, num_messages, timings)
+            for app_name, socket_url in live_pages
+        ]
+    )
+
+
+def run_live(
+    server, config_name, num_participants, num_messages, admin_secret_code, timings
+):
+    session_code = server.rest_post(
+        '/api/sessions',
+        dict(session_config_name=config_name, num_participants=num_participants),
+    ).json()['code']
+    codes = server.get_participant_codes(session_code)
+    with ThreadPoolExecutor(len(codes)) as pool:
+        live_pages = list(
+            pool.map(
+                lambda code: skip_to_live_page(
+                    server, code, admin_secret_code, timings
+                ),
+                codes,
+            )
+        )
+    live_pages = [page for page in live_pages if page]
+    if live_pages:
+        asyncio.run(send_all_live_messages(live_pages, num_messages, timings))
+
+
+def format_row(label, values, unit=''):
+    if not values:
+        return f'  {label:<16} -'
+    values = sorted(values)
+    p50, p95, p99 = [percentile(values, p) for p in [50, 95, 99]]
+    return (
+        f'  {label:<16} n={len(values):<7} p50={p50:.1f}{unit}  '
+        f'p95={p95:.1f}{unit}  p99={p99:.1f}{unit}  max={values[-1]:.1f}{unit}'
+    )
+
+
+def report(config_name, timings, seconds):
+    print(f'{config_name} ({seconds:.0f} s)')
+    print(format_row('page latency', timings.samples['page_ms'], 'ms'))
+    print(format_row('live round trip', timings.samples['live_ms'], 'ms'))
+    print(format_row('db queries/page', timings.samples['db_queries']))
+    for error in timings.errors[:5]:
+        print('  ERROR:', error)
+    if len(timings.errors) > 5:
+        print(f'  ...and {len(timings.errors) - 5} more errors')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('configs', nargs='*', help='default: all session configs')
+    parser.add_argument('--participants', type=int, default=100)
+    parser.add_argument('--server', default='http://localhost:8000')
+    parser.add_argument(
+        '--live-messages', type=int, default=20, help='per participant'
+    )
+    parser.add_argument(
+        '--rest-key',
+        default=os.environ.get('OTREE_REST_KEY'),
+        help="the server's OTREE_REST_KEY, if it has one",
+    )
+    parser.add_argument(
+        '--admin-secret-code',
+        help="the server's admin secret code, to skip pages as timeouts "
+        "(default: computed from this project's SECRET_KEY)",
+    )
+    args = parser.parse_args()
+
+    import settings
+
+    admin_secret_code = args.admin_secret_code
+    if not admin_secret_code:
+        from otree.common import get_admin_secret_code
+
+        admin_secret_code = get_admin_secret_code()
+
+    configs = {c['name']: c for c in settings.SESSION_CONFIGS}
+    server = Server(args.server, args.rest_key)
+    for config_name in args.configs or list(configs):
+        timings = Timings()
+        start = time.time()
+        try:
+            run_pages(server, config_name, args.participants, timings)
+            if any(app in LIVE_MESSAGES for app in configs[config_name]['app_sequence']):
+                run_live(
+                    server,
+                    config_name,
+                    args.participants,
+                    args.live_messages,
+                    admin_secret_code,
+                    timings,
+                )
+        except Exception as exc:
+            timings.add_error(repr(exc))
+        report(config_name, timings, time.time() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 A demo of how rounds work in oTree, in the context of 'matching pennies'
@@ -33,6 +34,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def creating_session(subsession: Subsession):
     session = subsession.session
     import random
@@ -50,6 +52,7 @@ def creating_session(subsession: Subsession):
         subsession.group_like_round(3)
 
 
+@instrument
 def set_payoffs(group: Group):
     subsession = group.subsession
     session = group.session
@@ -1,7 +1,13 @@
 from otree.api import *
+from instrumentation import instrument
+from shared_out import get_or_none
+from live_methods import rate_limit
+from .simulation import simulate
 
 doc = """
-Monty Hall problem
+Monty Hall problem.
+After playing, participants can run a simulation of many games,
+with any number of doors, to compare with the class's results.
 """
 
 
@@ -9,6 +15,8 @@ class Constants(BaseConstants):
     name_in_url = 'monty_hall'
     players_per_group = None
     num_rounds = 1
+    # for the simulation
+    default_num_games = 100_000
 
 
 class Subsession(BaseSubsession):
@@ -61,8 +69,54 @@ class Decide2(Page):
         player.is_winner = player.door_finally_chosen == player.door_with_prize
 
 
+def get_class_curves(subsession: Subsession):
+    """The class's running win rates with each strategy: [[games played, win rate]]"""
+    curves = dict(stay=[], switch=[])
+    wins = dict(stay=0, switch=0)
+    for p in subsession.get_players():
+        is_winner = get_or_none(p, 'is_winner')
+        if is_winner is None:
+            continue
+        if p.door_finally_chosen == p.door_first_chosen:
+            strategy = 'stay'
+        else:
+            strategy = 'switch'
+        wins[strategy] += is_winner
+        n = len(curves[strategy]) + 1
+        curves[strategy].append([n, wins[strategy] / n])
+    return curves
+
+
+def vars_for_admin_report(subsession: Subsession):
+    return dict(
+        simulation=simulate(Constants.default_num_games),
+        class_curves=get_class_curves(subsession),
+    )
+
+
 class Results(Page):
     pass
 
 
-page_sequence = [Decide1, Decide2, Results]
+class Simulation(Page):
+    @staticmethod
+    @instrument
+    @rate_limit()
+    def live_method(player: Player, data):
+        try:
+            simulation = simulate(
+                int(data.get('num_games', Constants.default_num_games)),
+                int(data.get('num_doors', 3)),
+                int(data.get('num_opened', 1)),
+            )
+        except (AttributeError, TypeError, ValueError) as exc:
+            return {player.id_in_group: dict(error=str(exc))}
+        return {
+            player.id_in_group: dict(
+                simulation=simulation,
+                class_curves=get_class_curves(player.subsession),
+            )
+        }
+
+
+page_sequence = [Decide1, Decide2, Results, Simulation]
@@ -0,0 +1,149 @@
+"""
+Monte Carlo simulation of the Monty Hall game, generalized to num_doors doors,
+of which the host opens num_opened: never the player's first choice,
+and never the door with the prize.
+Then the player either stays with their first choice,
+or switches to one of the other doors that are still closed, at random.
+
+If NumPy is installed, the games are played in a vectorized way;
+otherwise in plain Python, which is statistically the same but much slower,
+so fewer games are played.
+Either way, the number of games is capped so that a simulation takes
+well under 0.1 s, since it runs in the live method, which holds up
+every other live page on the server while it runs.
+
+The results are cached, since the whole class will usually ask for the same
+simulation.
+"""
+
+import functools
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_DOORS = 100
+# the time taken is proportional to games x doors, so with more doors,
+# fewer games are played (e.g. 200,000 with 3 doors, 6,000 with 100)
+MAX_CELLS = 600_000
+MAX_CELLS_PYTHON = 60_000
+# number of points in each convergence curve
+NUM_CHECKPOINTS = 60
+
+
+def expected_win_rates(num_doors, num_opened):
+    """Returns (stay, switch)"""
+    stay = 1 / num_doors
+    # unless the first choice was right,
+    # the prize is behind one of the other closed doors
+    switch = (1 - stay) / (num_doors - 1 - num_opened)
+    return stay, switch
+
+
+def get_checkpoints(num_games):
+    """Numbers of games at which to sample the curves, evenly spaced on a log scale"""
+    checkpoints = {
+        round(math.exp(math.log(num_games) * i / (NUM_CHECKPOINTS - 1)))
+        for i in range(NUM_CHECKPOINTS)
+    }
+    return sorted(checkpoints)
+
+
+def play_games_numpy(num_games, num_doors, num_opened, rng):
+    """Returns boolean arrays: (stay won, switch won), 1 item per game"""
+    rows = np.arange(num_games)
+    prize = rng.integers(num_doors, size=num_games)
+    first = rng.integers(num_doors, size=num_games)
+    # give each door a random key; the host opens the doors with the smallest keys,
+    # other than the first choice and the prize
+    keys = rng.random((num_games, num_doors))
+    keys[rows, first] = np.inf
+    keys[rows, prize] = np.inf
+    opened = np.argpartition(keys, num_opened - 1, axis=1)[:, :num_opened]
+    # switch to the closed door with the smallest new key
+    keys = rng.random((num_games, num_doors))
+    keys[rows, first] = np.inf
+    np.put_along_axis(keys, opened, np.inf, axis=1)
+    switched_to = keys.argmin(axis=1)
+    return prize == first, prize == switched_to
+
+
+def play_game_python(num_doors, num_opened, rng):
+    """Returns (stay won, switch won)"""
+    prize = rng.randrange(num_doors)
+    first = rng.randrange(num_doors)
+    can_open = [door for door in range(num_doors) if door not in (first, prize)]
+    opened = set(rng.sample(can_open, num_opened))
+    closed = [
+        door for door in range(num_doors) if door != first and door not in opened
+    ]
+    return prize == first, prize == rng.choice(closed)
+
+
+def _simulate_numpy(num_games, num_doors, num_opened, seed, checkpoints):
+    rng = np.random.default_rng(seed)
+    curves = dict(stay=[], switch=[])
+    wins = dict(stay=0, switch=0)
+    checkpoints = np.array(checkpoints)
+    results = play_games_numpy(num_games, num_doors, num_opened, rng)
+    for strategy, won in zip(['stay', 'switch'], results):
+        cumulative = np.cumsum(won)
+        for n, num_won in zip(checkpoints, cumulative[checkpoints - 1]):
+            curves[strategy].append([int(n), int(num_won) / int(n)])
+        wins[strategy] = int(cumulative[-1])
+    return curves, wins
+
+
+def _simulate_python(num_games, num_doors, num_opened, seed, checkpoints):
+    rng = random.Random(seed)
+    curves = dict(stay=[], switch=[])
+    wins = dict(stay=0, switch=0)
+    checkpoints = set(checkpoints)
+    for n in range(1, num_games + 1):
+        stay_won, switch_won = play_game_python(num_doors, num_opened, rng)
+        wins['stay'] += stay_won
+        wins['switch'] += switch_won
+        if n in checkpoints:
+            for strategy in ['stay', 'switch']:
+                curves[strategy].append([n, wins[strategy] / n])
+    return curves, wins
+
+
+@functools.lru_cache(maxsize=32)
+def simulate(num_games, num_doors=3, num_opened=1, seed=0):
+    """
+    Plays num_games games with each strategy.
+    Returns the win rates, and convergence curves: [[games played, win rate so far]]
+    """
+    if not 3 <= num_doors <= MAX_DOORS:
+        raise ValueError(f'num_doors must be between 3 and {MAX_DOORS}')
+    if not 1 <= num_opened <= num_doors - 2:
+        raise ValueError('num_opened must be between 1 and num_doors - 2')
+    max_cells = MAX_CELLS_PYTHON if np is None else MAX_CELLS
+    num_games = min(num_games, max_cells // num_doors)
+    if num_games < 1:
+        raise ValueError('num_games must be at least 1')
+
+    checkpoints = get_checkpoints(num_games)
+    if np is None:
+        curves, wins = _simulate_python(
+            num_games, num_doors, num_opened, seed, checkpoints
+        )
+    else:
+        curves, wins = _simulate_numpy(
+            num_games, num_doors, num_opened, seed, checkpoints
+        )
+    expected_stay, expected_switch = expected_win_rates(num_doors, num_opened)
+    return dict(
+        num_games=num_games,
+        num_doors=num_doors,
+        num_opened=num_opened,
+        stay_rate=wins['stay'] / num_games,
+        switch_rate=wins['switch'] / num_games,
+        expected_stay=expected_stay,
+        expected_switch=expected_switch,
+        curves=curves,
+    )
@@ -0,0 +1,41 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+from . import *
+
+
+def call_live_method(method, group: Group, **kwargs):
+    # on page load
+    data = method(1, {})[1]
+    simulation = data['simulation']
+    expect(simulation['num_games'], Constants.default_num_games)
+    expect(abs(simulation['stay_rate'] - 1 / 3) < 0.01, True)
+    expect(abs(simulation['switch_rate'] - 2 / 3) < 0.01, True)
+    for strategy in ['stay', 'switch']:
+        expect(simulation['curves'][strategy][-1][0], simulation['num_games'])
+        expect(len(data['class_curves'][strategy]) <= len(group.get_players()), True)
+
+    simulation = method(1, dict(num_doors=10, num_opened=8, num_games=100_000))[1][
+        'simulation'
+    ]
+    expect(abs(simulation['stay_rate'] - 0.1) < 0.01, True)
+    expect(abs(simulation['switch_rate'] - 0.9) < 0.01, True)
+
+    for data in [
+        dict(num_doors=3, num_opened=2),
+        dict(num_doors=1000),
+        dict(num_games='many'),
+        'simulate',
+    ]:
+        expect('error' in method(1, data)[1], True)
+
+
+class PlayerBot(Bot):
+    def play_round(self):
+        yield Decide1, dict(door_first_chosen=self.player.id_in_group % 3 + 1)
+        if self.player.id_in_group % 2:
+            door = self.player.door_not_opened
+        else:
+            door = self.player.door_first_chosen
+        yield Decide2, dict(door_finally_chosen=door)
+        expect(self.player.is_winner, door == self.player.door_with_prize)
+        yield Results
+        yield Submission(Simulation, check_html=False)
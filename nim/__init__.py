@@ -1,4 +1,6 @@
 from otree.api import *
+from live_methods import live_tick
+from instrumentation import instrument
 
 doc = """
 Game of Nim. Players take turns adding a number. First to 15 wins.
@@ -27,6 +29,11 @@ class Player(BasePlayer):
     is_winner = models.BooleanField(initial=False)
 
 
+def merge_news(old, new):
+    """in tick mode, several moves can be combined into 1 message"""
+    return dict(new, news=old['news'] + new['news'])
+
+
 # PAGES
 class Game(Page):
     @staticmethod
@@ -34,6 +41,8 @@ class Game(Page):
         return dict(my_id=player.id_in_group)
 
     @staticmethod
+    @instrument
+    @live_tick(merge=merge_news)
     def live_method(player: Player, number):
         group = player.group
         my_id = player.id_in_group
@@ -46,14 +55,14 @@ class Game(Page):
             and group.current_number + number <= Constants.target
         ):
             group.current_number += number
-            news = dict(id_in_group=my_id, number=number)
+            news = [dict(id_in_group=my_id, number=number)]
             if group.current_number == Constants.target:
                 group.winner_id = player.id_in_group
                 group.game_over = True
             else:
                 group.whose_turn = other_id
         else:
-            news = None
+            news = []
 
         return {
             0: dict(
@@ -67,6 +76,7 @@ class Game(Page):
 
 class ResultsWaitPage(WaitPage):
     @staticmethod
+    @instrument
     def after_all_players_arrive(group: Group):
         winner = group.get_player_by_id(group.winner_id)
         winner.is_winner = True
@@ -0,0 +1,53 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+import random
+from live_methods import replay_live_messages
+from . import *
+
+
+def scripted_messages(group: Group):
+    # on page load
+    yield 1, 0
+    yield 2, 0
+    yield 1, 3
+    # not player 2's turn, and not allowed anyway
+    retval = yield 1, 2
+    expect(retval[0]['news'], [])
+    retval = yield 2, 5
+    expect(retval[0]['news'], [])
+    for id_in_group, number in [(2, 3), (1, 3), (2, 3), (1, 2)]:
+        retval = yield id_in_group, number
+    expect(retval[0]['game_over'], True)
+
+
+def random_messages(group: Group):
+    # seeded, so that each run sends the same messages
+    rng = random.Random(group.id_in_subsession)
+    state = (yield 1, 0)[0]
+    while not state['game_over']:
+        # sometimes the other player tries to go out of turn
+        id_in_group = rng.choice([1, 2, state['whose_turn'], state['whose_turn']])
+        number = rng.randint(1, 3)
+        state = (yield id_in_group, number)[0]
+
+
+def call_live_method(method, group: Group, case, **kwargs):
+    if case == 'scripted':
+        script = scripted_messages(group)
+    else:
+        script = random_messages(group)
+    replay_live_messages(method, group, script)
+
+    expect(group.current_number, Constants.target)
+    if case == 'scripted':
+        expect(group.winner_id, 1)
+
+
+class PlayerBot(Bot):
+
+    cases = ['scripted', 'random']
+
+    def play_round(self):
+        yield Submission(Game, check_html=False)
+        yield Submission(Results, check_html=False)
+        if self.case == 'scripted':
+            expect(self.player.is_winner, self.player.id_in_group == 1)
@@ -1,6 +1,8 @@
 from otree.api import *
 
-from .admin_report import vars_for_admin_report_prisoner
+from report_aggregates import update_report_aggregates
+from .admin_report import vars_for_admin_report_prisoner, record_group_prisoner
+from instrumentation import instrument
 
 doc = """
 This is a one-shot "Prisoner's Dilemma". Two players are asked separately
@@ -39,9 +41,11 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     for p in group.get_players():
         set_payoff(p)
+    update_report_aggregates(group, record_group_prisoner)
 
 
 def other_player(player: Player):
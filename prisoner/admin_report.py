@@ -1,54 +1,55 @@
 from shared_out import get_or_none
+from report_aggregates import get_report_aggregates, admin_report_socket_url
 
 COLOR_RED_DEFECT = "#ff4000"
 COLOR_BLUE_COOPERATE = "#00bfff"
 COLOR_MAROON_MIX = "#800040"
 
 
-def vars_for_admin_report_prisoner(subsession, constants):
-    group_names = []
+def record_group_prisoner(aggregates, group):
+    players = group.get_players()
+    if any(get_or_none(p, 'cooperated') is None for p in players):
+        return False
+    aggregates.series['group_names'].append("Group {}".format(group.id_in_subsession))
+    num_cooperated = 0
+    for p in players:
+        color = {True: COLOR_BLUE_COOPERATE, False: COLOR_RED_DEFECT}[p.cooperated]
+        aggregates.series["Player {}".format(p.id_in_group)].append(
+            dict(y=p.payoff, colorValue=color,)
+        )
+        aggregates.stats['payoff'].add(p.payoff)
 
-    # create player data list
-    player_data = []
-    group_strategies = []
-    for g in subsession.get_groups():
-        group_names.append("Group {}".format(g.id_in_subsession))
-        players = g.get_players()
-        num_cooperated = 0
-        if any(get_or_none(p, 'cooperated') is None for p in players):
-            continue
-        for p in players:
-            color = {True: COLOR_BLUE_COOPERATE, False: COLOR_RED_DEFECT}[p.cooperated]
-            player_data.append(
-                dict(
-                    name="Player {}".format(p.id_in_group),
-                    data=[dict(y=p.payoff, colorValue=color,)],
-                    type='column',
-                    colorKey='colorValue',
-                )
-            )
+        # updated local group payoffs list with this group's payoff inorder to calculate the group strategy
+        num_cooperated += p.cooperated
 
-            # updated local group payoffs list with this group's payoff inorder to calculate the group strategy
-            num_cooperated += p.cooperated
+    aggregates.series['group_strategies'].append(num_cooperated)
+    return True
 
-        group_strategies.append(num_cooperated)
 
-    # match players in player data by index so that; the "first" player in each group
-    # has payoff assigned for each highcharts series - design limitation by highcharts
-    player_data_matched = {}
-    for player in player_data:
-        name = player['name']
-        if name in player_data_matched.keys():
-            player_data_matched[name]['data'].append(player['data'][0])
-        else:
-            player_data_matched[name] = player
+def vars_for_admin_report_prisoner(subsession, constants):
+    aggregates = get_report_aggregates(subsession, record_group_prisoner)
+    group_names = aggregates.series['group_names']
+    group_strategies = aggregates.series['group_strategies']
 
-    # convert the values to a list
-    player_data_matched = list(player_data_matched.values())
+    # each highcharts series is the "first" (or second) player in every group,
+    # with 1 data point per group - design limitation by highcharts
+    player_data_matched = []
+    for id_in_group in range(1, constants.players_per_group + 1):
+        name = "Player {}".format(id_in_group)
+        player_data_matched.append(
+            dict(
+                name=name,
+                id=name,
+                data=aggregates.series[name],
+                type='column',
+                colorKey='colorValue',
+            )
+        )
 
-    payoff_all_players = [p.payoff for p in subsession.get_players()]
+    payoff_stats = aggregates.stats['payoff']
 
-    num_groups = len(group_strategies)
+    # avoid dividing by 0 if no group has finished yet
+    num_groups = len(group_strategies) or 1
     # build pie chart data - could be extracted into function!
     both_cooperated_percent = group_strategies.count(2) / num_groups * 100
     both_defected_percent = group_strategies.count(0) / num_groups * 100
@@ -73,15 +74,17 @@ def vars_for_admin_report_prisoner(subsession, constants):
     ]
 
     context = dict(
+        live_report_url=admin_report_socket_url(subsession),
         group_names=group_names,
         player_data_matched=player_data_matched,
         pie_chart_data=pie_chart_data,
+        group_strategies=group_strategies,
     )
-    if payoff_all_players:
+    if payoff_stats.count:
         context.update(
-            avg_payoff=sum(payoff_all_players) / len(payoff_all_players),
-            min_payoff=min(payoff_all_players),
-            max_payoff=max(payoff_all_players),
+            avg_payoff=payoff_stats.mean,
+            min_payoff=payoff_stats.min,
+            max_payoff=payoff_stats.max,
         )
         return context
     else:
@@ -1,6 +1,12 @@
 from otree.api import *
 
 from shared_out import set_players_per_group, get_or_none
+from report_aggregates import (
+    get_report_aggregates,
+    update_report_aggregates,
+    admin_report_socket_url,
+)
+from instrumentation import instrument
 
 doc = """
 This is a one-period public goods game with 3 players.
@@ -19,43 +25,49 @@ class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     set_players_per_group(subsession)
 
 
+def record_contributions(aggregates, group):
+    if get_or_none(group, 'total_contribution') == None:
+        return False
+    for p in group.get_players():
+        aggregates.stats['contribution'].add(p.contribution)
+        aggregates.series['contributions'].append(p.contribution)
+    return True
+
+
 def vars_for_admin_report(subsession: Subsession):
-    contributions = [
-        p.contribution
-        for p in subsession.get_players()
-        if get_or_none(p, 'contribution') != None
-    ]
+    contribution_stats = get_report_aggregates(
+        subsession, record_contributions
+    ).stats['contribution']
 
     all_contributions = []
     for ss in subsession.in_all_rounds():
-        round_contributions = [
-            p.contribution
-            for p in ss.get_players()
-            if get_or_none(p, 'contribution') != None
-        ]
+        round_contributions = get_report_aggregates(
+            ss, record_contributions
+        ).series['contributions']
         all_contributions.append(
             {'name': 'Round {}'.format(ss.round_number), 'data': round_contributions}
         )
 
-    if contributions:
+    num_players = subsession.session.num_participants
+    if contribution_stats.count:
         return dict(
+            live_report_url=admin_report_socket_url(subsession),
             contribution_exists=True,
-            players_per_group=len(subsession.get_players()),
-            avg_contribution=sum(contributions) / len(contributions),
-            min_contribution=min(contributions),
-            max_contribution=max(contributions),
+            players_per_group=num_players,
+            avg_contribution=contribution_stats.mean,
+            min_contribution=contribution_stats.min,
+            max_contribution=contribution_stats.max,
             all_contributions=all_contributions,
-            players=[
-                'Player {}'.format(i)
-                for i in range(1, len(subsession.get_players()) + 1)
-            ],
+            players=['Player {}'.format(i) for i in range(1, num_players + 1)],
         )
     else:
         return dict(
+            live_report_url=admin_report_socket_url(subsession),
             contribution_exists=False,
             avg_contribution='(no data)',
             min_contribution='(no data)',
@@ -85,16 +97,20 @@ def contribution_max(player: Player):
     return config['endowment']
 
 
+@instrument
 def set_payoffs(group: Group):
     session = group.session
     config = session.config
 
-    group.total_contribution = sum([p.contribution for p in group.get_players()])
+    players = group.get_players()
+    group.total_contribution = sum([p.contribution for p in players])
+    # groups can be bigger or smaller than players_per_group (see get_group_sizes)
     group.individual_share = (
-        group.total_contribution * config['multiplier'] / config['players_per_group']
+        group.total_contribution * config['multiplier'] / len(players)
     )
-    for p in group.get_players():
+    for p in players:
         p.payoff = (config['endowment'] - p.contribution) + group.individual_share
+    update_report_aggregates(group, record_contributions)
 
 
 class Introduction(Page):
@@ -0,0 +1,151 @@
+"""
+Admin reports that don't need to scan every player on every refresh:
+each app keeps running totals, updated when a group finishes,
+and pushes the update to open admin reports over a websocket,
+so they don't need to be refreshed either.
+"""
+
+import asyncio
+from collections import defaultdict
+
+
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+
+class ReportAggregates:
+    """Running totals for the admin report of 1 subsession"""
+
+    def __init__(self):
+        self.group_ids = set()
+        self.stats = defaultdict(RunningStats)
+        self.series = defaultdict(list)
+
+
+# keyed by (app name, subsession ID)
+REPORT_AGGREGATES = {}
+
+
+def get_report_aggregates(subsession, record_group):
+    """
+    So that the admin report doesn't need to scan every player on every refresh,
+    each app updates running totals when a group finishes (see update_report_aggregates).
+    record_group(aggregates, group) adds a group's data,
+    and returns False if the group is not finished yet.
+    The first time the report is opened (or after a server restart),
+    the aggregates are built from the database.
+    """
+    key = (type(subsession).__module__, subsession.id)
+    aggregates = REPORT_AGGREGATES.get(key)
+    if aggregates is None:
+        aggregates = ReportAggregates()
+        for group in subsession.get_groups():
+            if record_group(aggregates, group):
+                aggregates.group_ids.add(group.id)
+        REPORT_AGGREGATES[key] = aggregates
+    return aggregates
+
+
+def update_report_aggregates(group, record_group):
+    """Call this after a group's payoffs are set."""
+    key = (type(group).__module__, group.subsession_id)
+    aggregates = REPORT_AGGREGATES.get(key)
+    if aggregates is None:
+        # will be built from the database when the report is opened.
+        return
+    if group.id in aggregates.group_ids:
+        # the group was already counted, so its payoffs were changed.
+        # we can't subtract the old values, so start over.
+        del REPORT_AGGREGATES[key]
+        push_admin_report_update(group, dict(reload=True))
+        return
+    lengths = {name: len(values) for name, values in aggregates.series.items()}
+    if record_group(aggregates, group):
+        aggregates.group_ids.add(group.id)
+        push_admin_report_update(
+            group,
+            dict(
+                stats={
+                    name: dict(count=st.count, mean=st.mean, min=st.min, max=st.max)
+                    for name, st in aggregates.stats.items()
+                },
+                series={
+                    name: values[lengths.get(name, 0) :]
+                    for name, values in aggregates.series.items()
+                },
+            ),
+        )
+
+
+def _admin_report_channel_code(session_code, app_name):
+    """
+    Signed with the server's SECRET_KEY (like oTree's chat channels),
+    so a participant who knows the session code can't work it out and subscribe.
+    Only the admin report page shows it, and that requires the admin login
+    if AUTH_LEVEL is set.
+    """
+    from otree.common import signer_sign
+
+    signed = signer_sign(f'admin_report-{session_code}-{app_name}')
+    # just the signature, after the last '.'
+    signature = signed.rsplit('.', 1)[-1]
+    return f'{app_name}-{signature}'
+
+
+def admin_report_socket_url(subsession):
+    """
+    The admin report subscribes to this to get pushed updates as groups finish,
+    rather than having to be refreshed.
+    It uses the same websocket route as live pages, with a channel name
+    that can't clash with a real participant.
+    """
+    from otree.channels import utils as channel_utils
+
+    session_code = subsession.session.code
+    return channel_utils.live_path(
+        session_code=session_code,
+        page_index='admin_report',
+        participant_code=_admin_report_channel_code(
+            session_code, type(subsession).__module__
+        ),
+        page_name='AdminReport',
+    )
+
+
+def push_admin_report_update(group, data):
+    """
+    Sends data to every open admin report of this app in the session.
+    group can be a group or a player.
+    """
+    from otree.channels import utils as channel_utils
+
+    session_code = group.session.code
+    channel = channel_utils.live_group(
+        session_code,
+        'admin_report',
+        _admin_report_channel_code(session_code, type(group).__module__),
+    )
+    data = dict(data, round_number=group.round_number)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # e.g. after_all_players_arrive, which doesn't run in the event loop
+        channel_utils.sync_group_send(group=channel, data=data)
+    else:
+        loop.create_task(channel_utils.group_send(group=channel, data=data))
@@ -0,0 +1,222 @@
+"""
+Reaction time statistics for stroop and go_no_go.
+
+Data is passed in as columns (1 list per variable, 1 item per trial),
+so that a whole session can be summarized in 1 pass.
+If NumPy is installed, it's used to compute everything in a vectorized way;
+otherwise we fall back to plain Python, which gives the same results
+but is slower for large sessions.
+"""
+
+import math
+import statistics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def summarize_by_player(
+    player_ids, reaction_ms, is_error=None, is_congruent=None, trim_sd=None
+):
+    """
+    Returns a dict keyed by player ID, with the stats of each player's trials.
+    reaction_ms can contain None, for trials with no response.
+    If trim_sd is given, reaction times more than trim_sd standard deviations
+    from the player's mean are dropped as outliers.
+    """
+    if not player_ids:
+        return {}
+    if is_error is None:
+        is_error = [False] * len(player_ids)
+    if np is None:
+        return _summarize_by_player_python(
+            player_ids, reaction_ms, is_error, is_congruent, trim_sd
+        )
+    return _summarize_by_player_numpy(
+        player_ids, reaction_ms, is_error, is_congruent, trim_sd
+    )
+
+
+def summarize(reaction_ms, is_error=None, is_congruent=None, trim_sd=None):
+    """Same as summarize_by_player, but treating all trials as 1 group."""
+    stats = summarize_by_player(
+        [0] * len(reaction_ms), reaction_ms, is_error, is_congruent, trim_sd
+    )
+    return stats.get(0, _empty_stats())
+
+
+def for_display(stats):
+    """Rounds the stats for showing in a template, with '-' for missing values"""
+    display = {}
+    for key, value in stats.items():
+        if value is None:
+            value = '-'
+        elif key == 'error_rate':
+            value = '{:.0%}'.format(value)
+        elif isinstance(value, float):
+            value = round(value)
+        display[key] = value
+    return display
+
+
+def _empty_stats():
+    return dict(
+        num_trials=0,
+        num_errors=0,
+        error_rate=None,
+        num_rts=0,
+        num_trimmed=0,
+        mean=None,
+        median=None,
+        sd=None,
+        congruent_mean=None,
+        incongruent_mean=None,
+        congruency_effect=None,
+    )
+
+
+def _none_if_nan(value):
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return value
+
+
+def _summarize_by_player_python(
+    player_ids, reaction_ms, is_error, is_congruent, trim_sd
+):
+    trials_by_player = {}
+    for i, pid in enumerate(player_ids):
+        trials_by_player.setdefault(pid, []).append(i)
+
+    result = {}
+    for pid, indexes in trials_by_player.items():
+        rts = [reaction_ms[i] for i in indexes if reaction_ms[i] is not None]
+        num_before_trimming = len(rts)
+        if trim_sd is not None and len(rts) > 1:
+            mean = statistics.mean(rts)
+            sd = statistics.stdev(rts)
+            indexes = [
+                i
+                for i in indexes
+                if reaction_ms[i] is None or abs(reaction_ms[i] - mean) <= trim_sd * sd
+            ]
+            rts = [reaction_ms[i] for i in indexes if reaction_ms[i] is not None]
+
+        stats = _empty_stats()
+        stats['num_trials'] = len(trials_by_player[pid])
+        stats['num_errors'] = sum(bool(is_error[i]) for i in trials_by_player[pid])
+        stats['error_rate'] = stats['num_errors'] / stats['num_trials']
+        stats['num_rts'] = len(rts)
+        stats['num_trimmed'] = num_before_trimming - len(rts)
+        if rts:
+            stats['mean'] = statistics.mean(rts)
+            stats['median'] = statistics.median(rts)
+        if len(rts) > 1:
+            stats['sd'] = statistics.stdev(rts)
+        if is_congruent is not None:
+            congruent = [
+                reaction_ms[i]
+                for i in indexes
+                if reaction_ms[i] is not None and is_congruent[i]
+            ]
+            incongruent = [
+                reaction_ms[i]
+                for i in indexes
+                if reaction_ms[i] is not None and not is_congruent[i]
+            ]
+            if congruent:
+                stats['congruent_mean'] = statistics.mean(congruent)
+            if incongruent:
+                stats['incongruent_mean'] = statistics.mean(incongruent)
+            if congruent and incongruent:
+                stats['congruency_effect'] = (
+                    stats['incongruent_mean'] - stats['congruent_mean']
+                )
+        result[pid] = stats
+    return result
+
+
+def _group_mean_sd(group_index, num_groups, values, mask):
+    count = np.bincount(group_index[mask], minlength=num_groups)
+    total = np.bincount(group_index[mask], weights=values[mask], minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        deviation = np.where(mask, values - mean[group_index], 0)
+        sum_sq = np.bincount(
+            group_index, weights=deviation * deviation, minlength=num_groups
+        )
+        sd = np.sqrt(sum_sq / (count - 1))
+    sd[count < 2] = np.nan
+    return count, mean, sd
+
+
+def _group_median(group_index, num_groups, values, mask, count):
+    # sort by group, then by value, so that each group's values are contiguous.
+    idx = group_index[mask]
+    vals = values[mask]
+    order = np.lexsort((vals, idx))
+    sorted_vals = vals[order]
+    starts = np.concatenate([[0], np.cumsum(count)[:-1]])
+    median = np.full(num_groups, np.nan)
+    has_values = count > 0
+    lo = starts[has_values] + (count[has_values] - 1) // 2
+    hi = starts[has_values] + count[has_values] // 2
+    median[has_values] = (sorted_vals[lo] + sorted_vals[hi]) / 2
+    return median
+
+
+def _summarize_by_player_numpy(
+    player_ids, reaction_ms, is_error, is_congruent, trim_sd
+):
+    unique_ids, group_index = np.unique(np.asarray(player_ids), return_inverse=True)
+    num_groups = len(unique_ids)
+    rts = np.array(
+        [np.nan if rt is None else rt for rt in reaction_ms], dtype=float
+    )
+    errors = np.asarray(is_error, dtype=bool)
+    has_rt = ~np.isnan(rts)
+
+    num_trials = np.bincount(group_index, minlength=num_groups)
+    num_errors = np.bincount(group_index[errors], minlength=num_groups)
+
+    count, mean, sd = _group_mean_sd(group_index, num_groups, rts, has_rt)
+    num_before_trimming = count
+    keep = has_rt
+    if trim_sd is not None:
+        limit = trim_sd * sd[group_index]
+        with np.errstate(invalid='ignore'):
+            outlier = np.abs(rts - mean[group_index]) > limit
+        # if SD is undefined (fewer than 2 RTs), nothing is trimmed
+        keep = has_rt & ~(outlier & ~np.isnan(limit))
+        count, mean, sd = _group_mean_sd(group_index, num_groups, rts, keep)
+    median = _group_median(group_index, num_groups, rts, keep, count)
+
+    congruent_mean = incongruent_mean = np.full(num_groups, np.nan)
+    if is_congruent is not None:
+        congruent = np.asarray(is_congruent, dtype=bool)
+        _, congruent_mean, _ = _group_mean_sd(
+            group_index, num_groups, rts, keep & congruent
+        )
+        _, incongruent_mean, _ = _group_mean_sd(
+            group_index, num_groups, rts, keep & ~congruent
+        )
+
+    result = {}
+    for g, pid in enumerate(unique_ids.tolist()):
+        result[pid] = dict(
+            num_trials=int(num_trials[g]),
+            num_errors=int(num_errors[g]),
+            error_rate=float(num_errors[g] / num_trials[g]),
+            num_rts=int(count[g]),
+            num_trimmed=int(num_before_trimming[g] - count[g]),
+            mean=_none_if_nan(mean[g]),
+            median=_none_if_nan(median[g]),
+            sd=_none_if_nan(sd[g]),
+            congruent_mean=_none_if_nan(congruent_mean[g]),
+            incongruent_mean=_none_if_nan(incongruent_mean[g]),
+            congruency_effect=_none_if_nan(incongruent_mean[g] - congruent_mean[g]),
+        )
+    return result
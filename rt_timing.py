@@ -0,0 +1,75 @@
+"""
+Timing of responses in the reaction time tasks (stroop and go_no_go).
+The browser side is in _static/global/rt_timing.js.
+
+The stimulus is added to the page in an animation frame, and is on screen
+from the next one, so the next frame's timestamp is the display time.
+The reaction time is measured from when the stimulus was presented rather
+than from when the page's code ran (which would add up to 1 frame).
+The key press time is the event's own timestamp.
+Both are fractional milliseconds from performance.now().
+
+Each response also reports how long the display frame took, and how long the
+key press event waited before the page handled it.
+If either is long, the browser was busy (e.g. a slow laptop, or other tabs),
+so the reaction time could be off by that much, and the trial is flagged.
+
+The browser also estimates the offset between its clock and the server's
+from the round trip time of the previous message, so that trials can be
+lined up with server-side events.
+
+With the session config's rt_batch_mode, the page gets the whole trial schedule
+when it loads, runs the trials by itself (showing the feedback itself),
+and sends all the responses in 1 message at the end, which the server checks
+against the schedule and saves in 1 transaction. So the time between trials
+doesn't depend on the network, and there is 1 message per participant
+instead of 1 per trial. If the page is reloaded, the trials start over.
+"""
+
+import math
+import time
+
+# frames or input events delayed by more than this mean the timing is unreliable.
+# at 60 Hz, a frame is ~17 ms.
+JANK_THRESHOLD_MS = 50
+
+
+def server_time_ms():
+    return time.time() * 1000
+
+
+def _get_float(data, key):
+    try:
+        value = float(data[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if math.isfinite(value):
+        return value
+
+
+def get_reaction_ms(data):
+    """
+    Reaction time from a response message, rounded to the microsecond.
+    Returns None if the timestamps are missing or make no sense.
+    """
+    displayed = _get_float(data, 'displayed_timestamp')
+    answered = _get_float(data, 'answered_timestamp')
+    if displayed is None or answered is None or answered <= displayed:
+        return None
+    return round(answered - displayed, 3)
+
+
+def get_timing(data, received_ms):
+    """The timing fields that the Trial models of both tasks have."""
+    frame_ms = _get_float(data, 'frame_ms')
+    input_lag_ms = _get_float(data, 'input_lag_ms')
+    return dict(
+        server_received_ms=received_ms,
+        clock_offset_ms=_get_float(data, 'clock_offset_ms'),
+        frame_ms=frame_ms,
+        input_lag_ms=input_lag_ms,
+        is_janky=any(
+            value is not None and value > JANK_THRESHOLD_MS
+            for value in [frame_ms, input_lag_ms]
+        ),
+    )
@@ -8,6 +8,11 @@ SESSION_CONFIGS = [
         app_sequence=['double_auction'],
         num_demo_participants=3,
         players_per_group=3,
+        live_tick_ms=0,
+        live_save_ms=0,
+        live_messages_per_second=0,
+        live_group_messages_per_second=0,
+        bot_live_messages_per_second=0,
     ),
     dict(
         name='dollar_auction',
@@ -15,18 +20,27 @@ SESSION_CONFIGS = [
         app_sequence=['dollar_auction'],
         num_demo_participants=3,
         players_per_group=3,
+        live_tick_ms=0,
+        live_save_ms=0,
+        live_messages_per_second=0,
+        live_group_messages_per_second=0,
+        bot_live_messages_per_second=0,
     ),
     dict(
         name='stroop',
         display_name='Stroop test',
         app_sequence=['stroop'],
         num_demo_participants=1,
+        rt_batch_mode=False,
+        bot_live_messages_per_second=0,
     ),
     dict(
         name='go_no_go',
         display_name='Go/No-Go task',
         app_sequence=['go_no_go'],
         num_demo_participants=1,
+        rt_batch_mode=False,
+        bot_live_messages_per_second=0,
     ),
     dict(
         name='bigfive',
@@ -39,12 +53,15 @@ SESSION_CONFIGS = [
         display_name="Race game / Nim (take turns adding numbers to reach a target)",
         app_sequence=['nim'],
         num_demo_participants=2,
+        live_tick_ms=0,
+        bot_live_messages_per_second=0,
     ),
     dict(
         name='monty_hall',
         display_name="Monty Hall (3-door problem from 'The Price is Right')",
         app_sequence=['monty_hall'],
         num_demo_participants=1,
+        live_messages_per_second=1,
     ),
     dict(
         name='public_goods',
@@ -131,11 +148,40 @@ SESSION_CONFIGS = [
 # the session config can be accessed from methods in your apps as self.session.config,
 # e.g. self.session.config['participation_fee']
 
+# live_tick_ms: set it to e.g. 100 to batch live page updates,
+# so that each player gets at most 1 update every 100 ms.
+# 0 means every update is sent right away.
+
+# live_save_ms: set it to e.g. 1000 so that double_auction and dollar_auction
+# keep each group's market/auction in memory and save it at most once per second,
+# rather than on every offer or bid (see group_actor.py).
+# 0 means it's saved on every message.
+
+# live_messages_per_second, live_group_messages_per_second: limit how fast
+# each participant, and each group, can send offers or bids in double_auction
+# and dollar_auction, or run simulations in monty_hall
+# (see rate_limit in live_methods.py). Messages over the limit
+# are held back and merged, and the participant is told to slow down.
+# 0 means no limit.
+
+# rt_batch_mode: in stroop and go_no_go, the page runs all the trials by itself
+# and sends the responses at the end, instead of 1 message per trial
+# (see rt_timing.py).
+
+# bot_live_messages_per_second: how fast the bots in tests.py send live messages
+# (see replay_live_messages in live_methods.py).
+# 0 means as fast as possible, to benchmark the live method.
+
+# group_remainder: for apps grouped by players_per_group, what to do with
+# the leftover players when the number of participants isn't a multiple of it:
+# 'spread' (default) adds them to other groups, 1 each; 'merge' adds them all
+# to the last group; 'separate' puts them in a smaller group of their own.
+
 SESSION_CONFIG_DEFAULTS = dict(
     real_world_currency_per_point=1.00, participation_fee=0.00, doc=""
 )
 
-PARTICIPANT_FIELDS = ['transaction_history']
+PARTICIPANT_FIELDS = ['transaction_history', 'reaction_times']
 
 # ISO-639 code
 # for example: de, fr, ja, ko, zh-hans
@@ -1,11 +1,101 @@
+import functools
+import json
+from pathlib import Path
+
+
+def get_group_sizes(num_players, ppg, remainder='spread'):
+    """
+    How to split the players into groups of ppg, when the number of players
+    isn't a multiple of ppg:
+    spread: the leftover players are spread over the groups,
+        so some groups have 1 more player (e.g. 10 players, ppg 3 -> 4, 3, 3)
+    merge: the leftover players join the last group (10, 3 -> 3, 3, 4)
+    separate: the leftover players form a smaller group (10, 3 -> 3, 3, 3, 1)
+    """
+    num_groups, leftover = divmod(num_players, ppg)
+    if num_groups == 0:
+        return [num_players]
+    if remainder == 'spread':
+        size, num_bigger = divmod(num_players, num_groups)
+        return [size + 1] * num_bigger + [size] * (num_groups - num_bigger)
+    if remainder == 'merge':
+        return [ppg] * (num_groups - 1) + [ppg + leftover]
+    if remainder == 'separate':
+        return [ppg] * num_groups + ([leftover] if leftover else [])
+    raise ValueError(
+        f'group_remainder must be spread, merge or separate, not {remainder!r}'
+    )
+
+
+# keyed by session ID. the group matrix is the same in every round,
+# so it's only computed once per session.
+GROUP_MATRICES = {}
+
+
+def get_group_matrix(session):
+    """Rows of id_in_subsession, 1 per group"""
+    matrix = GROUP_MATRICES.get(session.id)
+    if matrix is None:
+        config = session.config
+        sizes = get_group_sizes(
+            session.num_participants,
+            config['players_per_group'],
+            config.get('group_remainder', 'spread'),
+        )
+        matrix = []
+        for size in sizes:
+            start = len(matrix) and matrix[-1][-1]
+            matrix.append(list(range(start + 1, start + size + 1)))
+        GROUP_MATRICES[session.id] = matrix
+    return matrix
+
+
 def set_players_per_group(subsession):
-    session = subsession.session
-    config = session.config
-    ppg = config['players_per_group']
+    """
+    Groups the players by the session config's players_per_group
+    (and group_remainder, see get_group_sizes).
+    Call it in creating_session.
+
+    Unlike subsession.set_group_matrix, this doesn't commit after each group,
+    which is slow with a big class: the groups are created and the players
+    moved into them with 1 flush each, inside oTree's transaction,
+    so if creating the session fails later, nothing is left behind.
+    Apps with roles use set_group_matrix, which also sets each player's role.
+    """
+    import importlib
+    from sqlalchemy.orm import object_session
+    from otree.constants import get_roles
 
+    models = importlib.import_module(type(subsession).__module__)
+    matrix = get_group_matrix(subsession.session)
+    if get_roles(models.Constants):
+        subsession.set_group_matrix(matrix)
+        return
+
+    # ordered by id_in_subsession
     players = subsession.get_players()
-    matrix = [players[i : i + ppg] for i in range(0, len(players), ppg)]
-    subsession.set_group_matrix(matrix)
+    subsession.player_set.update({models.Player.group_id: None})
+    subsession.group_set.delete()
+    groups = [
+        models.Group(
+            session=subsession.session,
+            subsession=subsession,
+            round_number=subsession.round_number,
+            id_in_subsession=id_in_subsession,
+        )
+        for id_in_subsession in range(1, len(matrix) + 1)
+    ]
+    # flushed, not committed, so that the groups have IDs for the rest of
+    # creating_session
+    db_session = object_session(subsession)
+    db_session.add_all(groups)
+    db_session.flush()
+    for group, row in zip(groups, matrix):
+        for id_in_group, id_in_subsession in enumerate(row, start=1):
+            player = players[id_in_subsession - 1]
+            player.group = group
+            player.id_in_group = id_in_group
+    db_session.flush()
 
 
 def get_or_none(obj, fieldname):
@@ -16,3 +106,45 @@ def get_or_none(obj, fieldname):
         return getattr(obj, fieldname)
     except TypeError:
         return None
+
+
+@functools.lru_cache()
+def read_stimuli_manifest(app_name):
+    """
+    Read once per process, rather than on every Task page,
+    so restart the server after running bundle_stimuli.py.
+    """
+    manifest_path = Path('_static', app_name, 'stimuli_manifest.json')
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text())
+
+
+def get_stimuli(app_name, num_images):
+    """
+    For the Task page of stroop and go_no_go.
+    If bundle_stimuli.py has been run, returns the bundle that contains all
+    the images, so the page can load them in 1 request.
+    The bundle can have more images than the task uses (e.g. go_no_go has 20
+    images but shows 10); the page only keeps the first num_images.
+    Otherwise, returns the paths of the individual images.
+    """
+    manifest = read_stimuli_manifest(app_name)
+    if manifest and manifest['num_images'] >= num_images:
+        return dict(
+            stimuli_bundle=manifest['bundle'], image_paths=[], num_images=num_images
+        )
+    image_paths = ['{}/{}.png'.format(app_name, i) for i in range(num_images)]
+    return dict(stimuli_bundle=None, image_paths=image_paths, num_images=num_images)
+
+
+def encode_trial_order(image_ids):
+    """
+    For the trial_order field of stroop and go_no_go:
+    the image IDs packed as a hex string, 1 byte per trial (so IDs must be under 256).
+    """
+    return bytes(image_ids).hex()
+
+
+def decode_trial_order(trial_order):
+    """Returns bytes, which can be indexed and sliced like a list of image IDs"""
+    return bytes.fromhex(trial_order)
@@ -1,8 +1,27 @@
 from otree.api import *
+import rt_stats
+import rt_timing
+import table_export
+from shared_out import get_stimuli, encode_trial_order, decode_trial_order
+from live_methods import drop_duplicates
+from instrumentation import instrument
 
 doc = """Stroop test."""
 
 
+class Constants(BaseConstants):
+    name_in_url = 'stroop'
+    instructions_template = 'stroop/instructions.html'
+    players_per_group = None
+    num_rounds = 1
+    colors = ['red', 'yellow', 'blue', 'green']
+    color_keys = [('r', 'red'), ('y', 'yellow'), ('b', 'blue'), ('g', 'green')]
+    num_trials = len(colors) * len(colors)
+    # for the admin report, reaction times more than this many SDs from the
+    # player's mean are treated as outliers
+    outlier_sd = 2.5
+
+
 def get_permutations():
     colors = Constants.colors
 
@@ -22,22 +41,17 @@ def get_permutations():
     return items
 
 
-def randomize_order():
-    import random
+# all stimuli, indexed by image_id. this is built once, and shared by all players.
+STIMULI = tuple(get_permutations())
 
-    permutations = get_permutations()
-    random.shuffle(permutations)
-    return permutations
 
+def randomize_order():
+    """Returns the order of image IDs, as encoded for the trial_order field"""
+    import random
 
-class Constants(BaseConstants):
-    name_in_url = 'stroop'
-    instructions_template = 'stroop/instructions.html'
-    players_per_group = None
-    num_rounds = 1
-    colors = ['red', 'yellow', 'blue', 'green']
-    color_keys = [('r', 'red'), ('y', 'yellow'), ('b', 'blue'), ('g', 'green')]
-    num_trials = len(colors) * len(colors)
+    order = list(range(len(STIMULI)))
+    random.shuffle(order)
+    return encode_trial_order(order)
 
 
 class Subsession(BaseSubsession):
@@ -49,6 +63,9 @@ class Group(BaseGroup):
 
 
 class Player(BasePlayer):
+    trial_order = models.StringField(
+        doc="Image IDs in the order they are shown to the player, as hex bytes"
+    )
     num_completed = models.IntegerField(initial=0)
     num_correct = models.IntegerField(initial=0)
     avg_congruent = models.FloatField()
@@ -63,59 +80,214 @@ class Trial(ExtraModel):
     color = models.StringField()
     is_correct = models.BooleanField()
     is_congruent = models.BooleanField()
-    reaction_ms = models.IntegerField()
-
-
-def get_current_trial(player: Player):
-    return Trial.filter(player=player, is_correct=None)[0]
+    reaction_ms = models.FloatField(
+        doc="From the frame the stimulus was shown in, to the key press"
+    )
+    server_received_ms = models.FloatField(
+        doc="Server clock (ms since the epoch) when the response arrived"
+    )
+    clock_offset_ms = models.FloatField(
+        doc="Estimated server clock minus browser clock, in ms"
+    )
+    frame_ms = models.FloatField(doc="Duration of the frame the stimulus was shown in")
+    input_lag_ms = models.FloatField(
+        doc="Time between the key press and the page handling it"
+    )
+    is_janky = models.BooleanField(
+        doc="The browser was too busy for this trial's timing to be reliable"
+    )
+
+
+def get_current_image_id(player: Player):
+    # num_completed is a cursor into the trial order,
+    # so we don't need to query the trials to know which one is next.
+    return decode_trial_order(player.trial_order)[player.num_completed]
 
 
 def is_finished(player: Player):
     return player.num_completed == Constants.num_trials
 
 
+def get_schedule(player: Player):
+    """For batch mode: the image IDs of the remaining trials"""
+    return list(decode_trial_order(player.trial_order)[player.num_completed :])
+
+
+def score_response(player: Player, image_id, data, received_ms):
+    """Updates the player's totals, and returns the fields of the response's Trial"""
+    stimulus = STIMULI[image_id]
+    is_correct = data.get('submission') == stimulus['color']
+    if is_correct:
+        player.num_correct += 1
+    player.num_completed += 1
+    return dict(
+        stimulus,
+        is_correct=is_correct,
+        reaction_ms=rt_timing.get_reaction_ms(data),
+        **rt_timing.get_timing(data, received_ms),
+    )
+
+
 # FUNCTIONS
+@instrument
 def creating_session(subsession: Subsession):
+    # Trial rows are not created here, but when the player answers them.
+    # that way, a big session doesn't need thousands of inserts before anyone can start.
     for p in subsession.get_players():
-        for permutation in randomize_order():
-            Trial.create(player=p, **permutation)
-
-
+        p.trial_order = randomize_order()
+
+
+def vars_for_admin_report(subsession: Subsession):
+    # load just the columns we need for all trials in 1 query
+    rows = (
+        Trial.objects_filter()
+        .join(Player)
+        .filter(Player.subsession_id == subsession.id)
+        .with_entities(
+            Trial.player_id,
+            Trial.reaction_ms,
+            Trial.is_correct,
+            Trial.is_congruent,
+            Trial.is_janky,
+        )
+        .all()
+    )
+    player_ids = [row[0] for row in rows]
+    reaction_ms = [row[1] for row in rows]
+    is_error = [not row[2] for row in rows]
+    is_congruent = [row[3] for row in rows]
+    num_janky = sum(bool(row[4]) for row in rows)
+
+    stats_by_player = rt_stats.summarize_by_player(
+        player_ids,
+        reaction_ms,
+        is_error=is_error,
+        is_congruent=is_congruent,
+        trim_sd=Constants.outlier_sd,
+    )
+    player_stats = []
+    for p in subsession.get_players():
+        if p.id in stats_by_player:
+            player_stats.append(
+                dict(
+                    rt_stats.for_display(stats_by_player[p.id]),
+                    id_in_subsession=p.id_in_subsession,
+                )
+            )
+    session_stats = rt_stats.summarize(
+        reaction_ms,
+        is_error=is_error,
+        is_congruent=is_congruent,
+        trim_sd=Constants.outlier_sd,
+    )
+    return dict(
+        player_stats=player_stats,
+        session_stats=rt_stats.for_display(session_stats),
+        outlier_sd=Constants.outlier_sd,
+        num_janky=num_janky,
+    )
+
+
+def record_batch(player: Player, responses, received_ms):
+    """
+    In batch mode, the browser runs the trials by itself, and sends the responses
+    to all of them at the end. Returns False if they don't match the schedule.
+    """
+    schedule = get_schedule(player)
+    if not isinstance(responses, list) or len(responses) != len(schedule):
+        return False
+    for image_id, data in zip(schedule, responses):
+        if not isinstance(data, dict) or data.get('image_id') != image_id:
+            return False
+    for image_id, data in zip(schedule, responses):
+        fields = score_response(player, image_id, data, received_ms)
+        Trial.create(player=player, **fields)
+    return True
+
+
+@instrument
+@drop_duplicates
 def live_method(player: Player, data):
+    received_ms = rt_timing.server_time_ms()
+
+    batch_mode = player.session.config.get('rt_batch_mode')
+    feedback = ''
+    if data and 'responses' in data:
+        if batch_mode and record_batch(player, data['responses'], received_ms):
+            return {player.id_in_group: dict(is_finished=True)}
+        print('invalid batch received from participant', player.participant.code)
+        # reply as if the page just loaded: with the schedule again
+        # (or the current trial, if not in batch mode), so the page can recover
+        data = {}
 
     if data:
         if is_finished(player):
             return
-        trial = get_current_trial(player)
 
         # guard against double-clicks
-        if data['image_id'] != trial.image_id:
+        image_id = get_current_image_id(player)
+        if data['image_id'] != image_id:
             return
-
-        displayed_timestamp = data['displayed_timestamp']
-        answered_timestamp = data['answered_timestamp']
-        trial.submission = data['submission']
-
-        trial.is_correct = trial.submission == trial.color
-        trial.reaction_ms = answered_timestamp - displayed_timestamp
-
-        if trial.is_correct:
-            player.num_correct += 1
-            feedback = '✓'
-        else:
-            feedback = '✗'
-        player.num_completed += 1
-
-    else:
-        feedback = ''
+        trial = Trial.create(
+            player=player, **score_response(player, image_id, data, received_ms)
+        )
+        feedback = '✓' if trial.is_correct else '✗'
+    elif batch_mode and not is_finished(player):
+        return {
+            player.id_in_group: dict(
+                schedule=get_schedule(player),
+                # so that the browser can show the feedback by itself
+                colors=[stimulus['color'] for stimulus in STIMULI],
+                server_ms=received_ms,
+            )
+        }
 
     if is_finished(player):
         return {player.id_in_group: dict(is_finished=True)}
 
-    payload = dict(feedback=feedback, image_id=get_current_trial(player).image_id)
+    payload = dict(
+        feedback=feedback,
+        image_id=get_current_image_id(player),
+        server_ms=received_ms,
+    )
     return {player.id_in_group: payload}
 
 
+def export_query():
+    """All trials of all sessions, for table_export"""
+    from otree.models import Participant, Session
+
+    return (
+        Trial.objects_filter()
+        .join(Player)
+        .join(Participant, Player.participant_id == Participant.id)
+        .join(Session, Player.session_id == Session.id)
+        .order_by(Trial.id)
+        .with_entities(
+            Session.code.label('session_code'),
+            Participant.code.label('participant_code'),
+            Player.round_number.label('round_number'),
+            Trial.image_id,
+            Trial.decoy_text,
+            Trial.color,
+            Trial.is_congruent,
+            Trial.is_correct,
+            Trial.reaction_ms,
+            Trial.server_received_ms,
+            Trial.clock_offset_ms,
+            Trial.frame_ms,
+            Trial.input_lag_ms,
+            Trial.is_janky,
+        )
+    )
+
+
+def custom_export(players):
+    # the trials are streamed directly from the database rather than
+    # being looked up player by player.
+    yield from table_export.iter_rows(export_query())
+
+
 # PAGES
 class Introduction(Page):
     pass
@@ -126,8 +298,7 @@ class Task(Page):
 
     @staticmethod
     def vars_for_template(player: Player):
-        image_paths = ['stroop/{}.png'.format(i) for i in range(Constants.num_trials)]
-        return dict(image_paths=image_paths)
+        return get_stimuli('stroop', Constants.num_trials)
 
     @staticmethod
     def js_vars(player: Player):
@@ -135,20 +306,17 @@ class Task(Page):
 
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
-        from statistics import mean
-
-        congruent_times = []
-        incongruent_times = []
-        for trial in Trial.filter(player=player):
-            if trial.is_congruent:
-                lst = congruent_times
-            else:
-                lst = incongruent_times
-            lst.append(trial.reaction_ms)
-
-        player.avg_congruent = int(mean(congruent_times))
-        player.avg_incongruent = int(mean(incongruent_times))
-        player.incongruent_minus_congruent = player.avg_incongruent - player.avg_congruent
+        trials = Trial.filter(player=player)
+        stats = rt_stats.summarize(
+            [trial.reaction_ms for trial in trials],
+            is_congruent=[trial.is_congruent for trial in trials],
+        )
+        if stats['congruency_effect'] is not None:
+            player.avg_congruent = int(stats['congruent_mean'])
+            player.avg_incongruent = int(stats['incongruent_mean'])
+            player.incongruent_minus_congruent = (
+                player.avg_incongruent - player.avg_congruent
+            )
 
 
 class Results(Page):
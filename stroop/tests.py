@@ -0,0 +1,144 @@
+from otree.api import Currency as c, currency_range, expect, Bot
+import math
+import random
+import rt_stats
+from live_methods import replay_live_messages
+from . import *
+
+
+def response(image_id, submission, reaction_ms):
+    # the timing fields that rt_timing.js sends
+    return dict(
+        image_id=image_id,
+        submission=submission,
+        displayed_timestamp=1000.0,
+        answered_timestamp=1000.0 + reaction_ms,
+        frame_ms=16.7,
+        input_lag_ms=1.0,
+        clock_offset_ms=0.0,
+    )
+
+
+def scripted_messages(player: Player):
+    """answers correctly, 500 ms for congruent and 600 ms for incongruent"""
+    my_id = player.id_in_group
+    # on page load
+    retval = yield my_id, {}
+    while not retval[my_id].get('is_finished'):
+        stimulus = STIMULI[retval[my_id]['image_id']]
+        reaction_ms = 500 if stimulus['is_congruent'] else 600
+        data = response(stimulus['image_id'], stimulus['color'], reaction_ms)
+        # like Task.html, each trial's seq is given when its image is shown
+        data['seq'] = player.num_completed + 1
+        retval = yield my_id, data
+        expect(retval[my_id]['last_seq'], data['seq'])
+        if player.num_completed == 1:
+            # the page resends the answer with the same seq if the reply was lost,
+            # which is ignored, then asks for the current state
+            duplicate_retval = yield my_id, data
+            expect(duplicate_retval, None)
+            state = yield my_id, {}
+            expect(state[my_id]['image_id'], retval[my_id]['image_id'])
+
+
+def random_messages(player: Player):
+    # seeded, so that each run sends the same messages
+    rng = random.Random(player.id_in_subsession)
+    my_id = player.id_in_group
+    retval = yield my_id, {}
+    while not retval[my_id].get('is_finished'):
+        image_id = retval[my_id]['image_id']
+        submission = rng.choice(Constants.colors)
+        retval = yield my_id, response(image_id, submission, rng.gauss(650, 150))
+
+
+def batch_messages(player: Player):
+    """like scripted_messages, but all answers in 1 message, as in rt_batch_mode"""
+    my_id = player.id_in_group
+    config = player.session.config
+    responses = []
+    for image_id in get_schedule(player):
+        stimulus = STIMULI[image_id]
+        reaction_ms = 500 if stimulus['is_congruent'] else 600
+        responses.append(response(image_id, stimulus['color'], reaction_ms))
+    # without rt_batch_mode, the batch is rejected, and the reply is the current trial
+    config['rt_batch_mode'] = False
+    retval = yield my_id, dict(responses=responses)
+    expect(retval[my_id]['image_id'], get_current_image_id(player))
+    expect(player.num_completed, 0)
+
+    config['rt_batch_mode'] = True
+    retval = yield my_id, {}
+    expect(retval[my_id]['schedule'], get_schedule(player))
+    # not in the order of the schedule, so it's rejected,
+    # and the reply is the schedule again
+    retval = yield my_id, dict(responses=responses[::-1])
+    expect(retval[my_id]['schedule'], get_schedule(player))
+    retval = yield my_id, dict(responses=responses)
+    expect(retval[my_id]['is_finished'], True)
+
+
+def expect_same_stats_with_and_without_numpy(
+    player_ids, reaction_ms, is_error, is_congruent
+):
+    """rt_stats's NumPy and plain Python versions give the same results"""
+    if rt_stats.np is None:
+        return
+    for trim_sd in [None, Constants.outlier_sd, 1]:
+        args = (player_ids, reaction_ms, is_error, is_congruent, trim_sd)
+        by_numpy = rt_stats._summarize_by_player_numpy(*args)
+        by_python = rt_stats._summarize_by_player_python(*args)
+        expect(sorted(by_numpy), sorted(by_python))
+        for pid, stats in by_python.items():
+            for key, value in stats.items():
+                numpy_value = by_numpy[pid][key]
+                if isinstance(value, float) and numpy_value is not None:
+                    expect(math.isclose(value, numpy_value, rel_tol=1e-9), True)
+                else:
+                    expect(numpy_value, value)
+
+
+def check_rt_stats(group: Group):
+    trials = [trial for p in group.get_players() for trial in Trial.filter(player=p)]
+    expect_same_stats_with_and_without_numpy(
+        [trial.player.id for trial in trials],
+        [trial.reaction_ms for trial in trials],
+        [not trial.is_correct for trial in trials],
+        [trial.is_congruent for trial in trials],
+    )
+    # edge cases: missing RTs, an outlier, a player with 1 RT or none, ties
+    expect_same_stats_with_and_without_numpy(
+        [1] * 6 + [2, 2] + [3, 3] + [4] * 3,
+        [500, None, 510, 3000, 490, 505, 400, None, None, None, 500, 500, 500],
+        [False, True] * 6 + [False],
+        [True, False] * 6 + [True],
+    )
+
+
+def call_live_method(method, group: Group, case, **kwargs):
+    # players_per_group is None, so all players are in 1 group
+    for player in group.get_players():
+        if case == 'scripted':
+            script = scripted_messages(player)
+        elif case == 'batch':
+            script = batch_messages(player)
+        else:
+            script = random_messages(player)
+        replay_live_messages(method, group, script)
+        expect(player.num_completed, Constants.num_trials)
+    if case == 'random':
+        check_rt_stats(group)
+
+
+class PlayerBot(Bot):
+
+    cases = ['scripted', 'random', 'batch']
+
+    def play_round(self):
+        yield Introduction
+        yield Submission(Task, check_html=False)
+        if self.case in ['scripted', 'batch']:
+            expect(self.player.num_correct, Constants.num_trials)
+            expect(self.player.avg_congruent, 500)
+            expect(self.player.avg_incongruent, 600)
+        yield Submission(Results, check_html=False)
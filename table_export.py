@@ -0,0 +1,111 @@
+"""
+Streaming export of the high-volume ExtraModel tables
+(stroop and go_no_go trials, double_auction transactions).
+
+Each of those apps has an export_query() that selects the table's rows
+(joined with the session, participant, etc.) as labelled columns.
+Rows are read with a server-side cursor (yield_per), and written out
+chunk by chunk, so memory use stays the same no matter how big the table is.
+
+The apps' custom_export uses this, so the tables can be downloaded from
+the "Data" tab as usual. However, oTree builds the whole download in memory
+before sending it, so for a semester's worth of data, export from the
+command line instead, which can also write Parquet (requires pyarrow):
+
+    python table_export.py stroop stroop_trials.csv
+    python table_export.py stroop stroop_trials.parquet
+"""
+
+import csv
+import decimal
+import sys
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+CHUNK_SIZE = 5000
+
+
+def get_header(query):
+    return [col['name'] for col in query.column_descriptions]
+
+
+def iter_rows(query, chunk_size=CHUNK_SIZE):
+    """Yields the header, then 1 tuple per row, fetching chunk_size rows at a time."""
+    yield get_header(query)
+    yield from query.yield_per(chunk_size)
+
+
+def iter_chunks(rows, chunk_size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(query, fp, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(fp)
+    for chunk in iter_chunks(iter_rows(query, chunk_size), chunk_size):
+        writer.writerows(chunk)
+
+
+def _arrow_type(sql_type):
+    # currency columns are stored as text, but exported as numbers
+    python_type = getattr(sql_type, 'MONEY_CLASS', None) or sql_type.python_type
+    if python_type is bool:
+        return pa.bool_()
+    if python_type is int:
+        return pa.int64()
+    if issubclass(python_type, (float, decimal.Decimal)):
+        return pa.float64()
+    return pa.string()
+
+
+def _arrow_value(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return value
+
+
+def write_parquet(query, path, chunk_size=CHUNK_SIZE):
+    """Each chunk becomes a Parquet row group."""
+    if pa is None:
+        raise ImportError('Parquet export requires pyarrow (pip install pyarrow)')
+    schema = pa.schema(
+        [(col['name'], _arrow_type(col['type'])) for col in query.column_descriptions]
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(query.yield_per(chunk_size), chunk_size):
+            columns = [
+                pa.array([_arrow_value(v) for v in values], type=field.type)
+                for values, field in zip(zip(*chunk), schema)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit('Usage: python table_export.py APP_NAME OUTPUT.csv|OUTPUT.parquet')
+    app_name, path = sys.argv[1:]
+
+    from otree.main import setup
+    from otree.common import get_models_module
+
+    setup()
+    query = get_models_module(app_name).export_query()
+    if path.endswith('.parquet'):
+        write_parquet(query, path)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as fp:
+            write_csv(query, fp)
+
+
+if __name__ == '__main__':
+    main()
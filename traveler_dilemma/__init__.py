@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 Kaushik Basu's famous traveler's dilemma (
@@ -45,6 +46,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     p1, p2 = group.get_players()
     if p1.claim == p2.claim:
@@ -1,4 +1,5 @@
 from otree.api import *
+from instrumentation import instrument
 
 doc = """
 This is a standard 2-player trust game where the amount sent by player 1 gets
@@ -42,6 +43,7 @@ def sent_back_amount_max(group: Group):
     return group.sent_amount * Constants.multiplier
 
 
+@instrument
 def set_payoffs(group: Group):
     p1 = group.get_player_by_id(1)
     p2 = group.get_player_by_id(2)
@@ -1,5 +1,6 @@
 from otree.api import *
 from shared_out import set_players_per_group
+from instrumentation import instrument
 
 
 doc = """
@@ -25,6 +26,7 @@ class Subsession(BaseSubsession):
     pass
 
 
+@instrument
 def creating_session(subsession: Subsession):
     set_players_per_group(subsession)
 
@@ -40,6 +42,7 @@ class Player(BasePlayer):
 
 
 # FUNCTIONS
+@instrument
 def set_payoffs(group: Group):
     players = group.get_players()
     group.num_volunteers = sum([p.volunteer for p in players])